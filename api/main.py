@@ -1,7 +1,8 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Set
+from pydantic import BaseModel, ValidationError
+from typing import Any, List, Dict, Optional, Set
+from collections import deque
 import json
 import uuid
 import asyncio
@@ -10,6 +11,9 @@ import logging
 import subprocess
 import os
 import signal
+import time
+
+from storage import create_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -40,38 +44,258 @@ class Equation(EquationCreate):
     timestamp: str
 
 
-# In-memory storage for equations
-equations: Dict[str, Equation] = {}
+class BatchError(BaseModel):
+    index: int
+    detail: str
+
+
+class BatchResult(BaseModel):
+    equations: List[Equation]
+    errors: List[BatchError]
+
+
+# Equations and viewers are partitioned into rooms, one per chat session
+DEFAULT_ROOM = "default"
+# Seconds a room with no viewers is kept after its last activity
+ROOM_IDLE_TTL = float(os.getenv("ROOM_IDLE_TTL", "3600"))
+ROOM_SWEEP_INTERVAL = float(os.getenv("ROOM_SWEEP_INTERVAL", "60"))
+# Mutations kept per room for delta sync; older reconnects get a full snapshot
+ROOM_CHANGELOG_SIZE = int(os.getenv("ROOM_CHANGELOG_SIZE", "500"))
+# Seconds between checks for equations written by other workers sharing the store
+EQUATION_STORE_POLL_INTERVAL = float(os.getenv("EQUATION_STORE_POLL_INTERVAL", "0.25"))
+
+# Persistent storage; rooms are loaded from it on first use
+store = create_store()
+
+
+class Room:
+    def __init__(self, room_id: str):
+        self.id = room_id
+        # In-memory storage for this room's equations
+        self.equations: Dict[str, Equation] = {}
+        self.connections: Set[WebSocket] = set()
+        self.last_active = time.monotonic()
+        # Bumped by every mutation; viewers reconnect with the last version they saw.
+        # Versions are local to this process, so the epoch tells a viewer whether they still apply.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        # (version, serialized message) for the most recent mutations
+        self.changes = deque(maxlen=ROOM_CHANGELOG_SIZE)
+        self.snapshot: Optional[str] = None
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def record(self, message: dict) -> str:
+        """Stamp a mutation with the next version, log it and return its serialized form"""
+        self.version += 1
+        message["version"] = self.version
+        text = json.dumps(message)
+        self.changes.append((self.version, text))
+        self.snapshot = None
+        return text
+
+    def snapshot_message(self) -> str:
+        """Serialized init message, rebuilt only after the room changes"""
+        if self.snapshot is None:
+            self.snapshot = json.dumps({
+                "type": "init",
+                "epoch": self.epoch,
+                "version": self.version,
+                "equations": [eq.dict() for eq in self.equations.values()]
+            })
+        return self.snapshot
+
+    def sync_messages(self, since: Optional[int], epoch: Optional[str] = None) -> List[str]:
+        """Messages that bring a viewer at version `since` of `epoch` up to date"""
+        if since is not None and epoch == self.epoch and 0 <= since <= self.version:
+            if since == self.version:
+                return []
+            # The log must still hold the first change the viewer missed
+            if self.changes and self.changes[0][0] <= since + 1:
+                return [text for version, text in self.changes if version > since]
+        return [self.snapshot_message()]
+
+
+rooms: Dict[str, Room] = {}
+
+
+def get_room(room_id: str) -> Room:
+    """Return the room with this ID, creating it on first use"""
+    room = rooms.get(room_id)
+    if room is None:
+        room = rooms[room_id] = Room(room_id)
+        room.equations = {data["id"]: Equation(**data) for data in store.load_room(room_id)}
+        logger.info(f"Loaded room {room_id} with {len(room.equations)} equations. Total rooms: {len(rooms)}")
+    room.touch()
+    return room
+
+
+async def expire_idle_rooms():
+    """Periodically drop rooms that have no viewers and have been idle for ROOM_IDLE_TTL"""
+    while True:
+        await asyncio.sleep(ROOM_SWEEP_INTERVAL)
+        cutoff = time.monotonic() - ROOM_IDLE_TTL
+        for room_id, room in list(rooms.items()):
+            if not room.connections and room.last_active < cutoff:
+                del rooms[room_id]
+                logger.info(f"Expired idle room {room_id} with {len(room.equations)} equations")
+
+
+def apply_mutation(room: Room, message: dict) -> bool:
+    """Apply a mutation made by another worker to a loaded room; returns whether anything changed"""
+    message_type = message.get("type")
+    if message_type in ("new_equation", "new_equations"):
+        new_equations = message["equations"] if message_type == "new_equations" else [message["equation"]]
+        added = [data for data in new_equations if data["id"] not in room.equations]
+        for data in added:
+            room.equations[data["id"]] = Equation(**data)
+        return bool(added)
+    if message_type == "delete_equation":
+        return room.equations.pop(message["equation_id"], None) is not None
+    if message_type == "clear_equations":
+        changed = bool(room.equations)
+        room.equations.clear()
+        return changed
+    return False
+
+
+async def follow_other_workers():
+    """Tail the shared store so viewers connected here see equations added through other workers"""
+    cursor = await asyncio.to_thread(store.latest_seq)
+    while True:
+        await asyncio.sleep(EQUATION_STORE_POLL_INTERVAL)
+        try:
+            cursor, changes = await asyncio.to_thread(store.changes_since, cursor)
+        except Exception as e:
+            logger.error(f"Error reading changes from equation store: {e}")
+            continue
+        for room_id, message in changes:
+            # Rooms not loaded here will read the change from the store when first used
+            room = rooms.get(room_id)
+            if room is not None and apply_mutation(room, message):
+                await manager.broadcast(room, message)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await store.start()
+    asyncio.create_task(expire_idle_rooms())
+    if store.shared:
+        asyncio.create_task(follow_other_workers())
+
+
+@app.on_event("shutdown")
+async def flush_store():
+    await store.stop()
+
+
+# Outbound messages buffered per connection before the overflow policy applies
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "256"))
+# "disconnect" closes clients that fall behind (they reconnect and resync), "drop" skips messages for them
+BROADCAST_OVERFLOW_POLICY = os.getenv("BROADCAST_OVERFLOW_POLICY", "disconnect")
+# Seconds a single send may take before the socket is considered dead
+BROADCAST_SEND_TIMEOUT = float(os.getenv("BROADCAST_SEND_TIMEOUT", "10"))
 
 
 # Store active WebSocket connections
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Each connection gets a bounded outbound queue drained by its own writer task,
+    so a slow or dead viewer never holds up the others. Broadcasts are
+    serialized to JSON once and enqueued for every connection.
+    """
 
-    async def connect(self, websocket: WebSocket):
+    def __init__(self):
+        self.active_connections: Dict[WebSocket, asyncio.Queue] = {}
+        self.writers: Dict[WebSocket, asyncio.Task] = {}
+        self.rooms: Dict[WebSocket, Room] = {}
+        # Keeps close() calls for evicted clients referenced until they finish
+        self.closing: Set[asyncio.Task] = set()
+
+    async def connect(self, websocket: WebSocket, room: Room, since: Optional[int] = None,
+                      epoch: Optional[str] = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"New WebSocket connection. Total connections: {len(self.active_connections)}")
+        # Computed after accept so nothing can change between catch-up and registration
+        initial_messages = room.sync_messages(since, epoch)
+        queue = asyncio.Queue(maxsize=max(BROADCAST_QUEUE_SIZE, len(initial_messages)))
+        # Queued before registering so they always precede any broadcast
+        for text in initial_messages:
+            queue.put_nowait(text)
+        self.active_connections[websocket] = queue
+        self.rooms[websocket] = room
+        room.connections.add(websocket)
+        self.writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
+        logger.info(f"New WebSocket connection in room {room.id}. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+            del self.active_connections[websocket]
+            room = self.rooms.pop(websocket)
+            room.connections.discard(websocket)
+            room.touch()
+            writer = self.writers.pop(websocket, None)
+            if writer is not None and writer is not asyncio.current_task():
+                writer.cancel()
             logger.info(f"WebSocket disconnected. Remaining connections: {len(self.active_connections)}")
 
-    async def broadcast(self, message: dict):
-        """Send a message to all connected clients"""
-        logger.info(f"Broadcasting message type: {message.get('type')} to {len(self.active_connections)} clients")
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message: {e}")
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Drain one connection's queue; any send failure removes the connection"""
+        try:
+            while True:
+                text = await queue.get()
+                await asyncio.wait_for(websocket.send_text(text), timeout=BROADCAST_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Dropping WebSocket after failed send: {e!r}")
+            self.disconnect(websocket)
+            await self._close(websocket)
+
+    async def _close(self, websocket: WebSocket, code: int = 1011):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for a single connection"""
+        self._enqueue(websocket, json.dumps(message))
+
+    def _enqueue(self, websocket: WebSocket, text: str):
+        queue = self.active_connections.get(websocket)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(text)
+        except asyncio.QueueFull:
+            if BROADCAST_OVERFLOW_POLICY == "drop":
+                logger.warning("Outbound queue full, dropping message for slow WebSocket client")
+                return
+            logger.warning("Outbound queue full, disconnecting slow WebSocket client")
+            self.disconnect(websocket)
+            # 1013 (try again later) tells the viewer to reconnect
+            task = asyncio.create_task(self._close(websocket, code=1013))
+            self.closing.add(task)
+            task.add_done_callback(self.closing.discard)
+
+    async def broadcast(self, room: Room, message: dict):
+        """Record a mutation in the room's change log and send it to every subscribed client"""
+        logger.info(f"Broadcasting message type: {message.get('type')} to {len(room.connections)} clients in room {room.id}")
+        text = room.record(message)
+        for connection in list(room.connections):
+            self._enqueue(connection, text)
 
 
 manager = ConnectionManager()
 
 
+async def publish(room: Room, message: dict):
+    """Persist a mutation and broadcast it to the room's viewers"""
+    store.record(room.id, message)
+    await manager.broadcast(room, message)
+
+
 # Routes
 @app.get("/")
 async def root():
@@ -79,37 +303,38 @@ async def root():
     return {"message": "Desmos Equations API is running"}
 
 
+def build_equation(equation: EquationCreate, position: int) -> Equation:
+    """Create an equation record; `position` is its 1-based number for the default label"""
+    cleaned_expression = equation.expression.strip()
+    logger.info(f"Processed expression: {cleaned_expression}")
+
+    return Equation(
+        id=str(uuid.uuid4()),
+        timestamp=datetime.now().isoformat(),
+        expression=cleaned_expression,
+        label=equation.label or f"Equation {position}",
+        color=equation.color or "#2d70b3"
+    )
+
+
 @app.post("/equations/", response_model=Equation)
-async def create_equation(equation: EquationCreate):
+async def create_equation(equation: EquationCreate, room: str = DEFAULT_ROOM):
     """Add a new equation from the chatbot to be displayed in Desmos"""
-    logger.info(f"Received equation: {equation.expression}")
+    logger.info(f"Received equation for room {room}: {equation.expression}")
 
     # Validate input
     if not equation.expression or len(equation.expression.strip()) == 0:
         logger.error("Empty equation received")
         raise HTTPException(status_code=400, detail="Expression cannot be empty")
 
-    # Create equation record
-    equation_id = str(uuid.uuid4())
-    timestamp = datetime.now().isoformat()
-
     try:
-        # Clean up the expression if needed
-        cleaned_expression = equation.expression.strip()
-        logger.info(f"Processed expression: {cleaned_expression}")
-
-        new_equation = Equation(
-            id=equation_id,
-            timestamp=timestamp,
-            expression=cleaned_expression,
-            label=equation.label or f"Equation {len(equations) + 1}",
-            color=equation.color or "#2d70b3"
-        )
-
-        equations[equation_id] = new_equation
-
-        # Broadcast the new equation to all connected Desmos viewers
-        await manager.broadcast({
+        target = get_room(room)
+        new_equation = build_equation(equation, len(target.equations) + 1)
+        equation_id = new_equation.id
+        target.equations[equation_id] = new_equation
+
+        # Broadcast the new equation to the room's Desmos viewers
+        await publish(target, {
             "type": "new_equation",
             "equation": new_equation.dict()
         })
@@ -122,35 +347,82 @@ async def create_equation(equation: EquationCreate):
         raise HTTPException(status_code=500, detail=f"Error processing equation: {str(e)}")
 
 
+@app.post("/equations/batch", response_model=BatchResult)
+async def create_equations_batch(batch: List[Any], room: str = DEFAULT_ROOM):
+    """
+    Add several equations at once and announce them in a single broadcast.
+    Each item is validated on its own: the valid ones are added and the rest
+    are reported by their index in the batch.
+    """
+    logger.info(f"Received batch of {len(batch)} equations for room {room}")
+
+    valid = []
+    errors = []
+    for index, item in enumerate(batch):
+        try:
+            equation = EquationCreate.model_validate(item)
+        except ValidationError as e:
+            logger.error(f"Invalid equation received at batch index {index}: {e.errors()}")
+            errors.append(BatchError(index=index, detail=f"Invalid equation: {e.errors()[0]['msg']}"))
+            continue
+        if not equation.expression or len(equation.expression.strip()) == 0:
+            logger.error(f"Empty equation received at batch index {index}")
+            errors.append(BatchError(index=index, detail="Expression cannot be empty"))
+            continue
+        valid.append(equation)
+
+    try:
+        target = get_room(room)
+        new_equations = [build_equation(equation, len(target.equations) + i + 1) for i, equation in enumerate(valid)]
+        for new_equation in new_equations:
+            target.equations[new_equation.id] = new_equation
+
+        if new_equations:
+            await publish(target, {
+                "type": "new_equations",
+                "equations": [eq.dict() for eq in new_equations]
+            })
+
+        logger.info(f"Successfully added {len(new_equations)} equations, rejected {len(errors)}")
+        return BatchResult(equations=new_equations, errors=errors)
+
+    except Exception as e:
+        logger.error(f"Error creating equations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing equations: {str(e)}")
+
+
 @app.get("/equations/", response_model=List[Equation])
-async def get_equations():
+async def get_equations(room: str = DEFAULT_ROOM):
     """Get all equations to initialize the Desmos viewer"""
-    logger.info(f"Returning {len(equations)} equations")
-    return list(equations.values())
+    target = get_room(room)
+    logger.info(f"Returning {len(target.equations)} equations for room {room}")
+    return list(target.equations.values())
 
 
 @app.get("/equations/{equation_id}", response_model=Equation)
-async def get_equation(equation_id: str):
+async def get_equation(equation_id: str, room: str = DEFAULT_ROOM):
     """Get a specific equation by ID"""
-    if equation_id not in equations:
+    target = get_room(room)
+    if equation_id not in target.equations:
         logger.warning(f"Equation not found: {equation_id}")
         raise HTTPException(status_code=404, detail="Equation not found")
 
     logger.info(f"Retrieved equation: {equation_id}")
-    return equations[equation_id]
+    return target.equations[equation_id]
 
 
 @app.delete("/equations/{equation_id}")
-async def delete_equation(equation_id: str):
+async def delete_equation(equation_id: str, room: str = DEFAULT_ROOM):
     """Delete a specific equation by ID"""
-    if equation_id not in equations:
+    target = get_room(room)
+    if equation_id not in target.equations:
         logger.warning(f"Attempt to delete non-existent equation: {equation_id}")
         raise HTTPException(status_code=404, detail="Equation not found")
 
-    deleted_equation = equations.pop(equation_id)
+    deleted_equation = target.equations.pop(equation_id)
 
-    # Broadcast the deletion to all connected Desmos viewers
-    await manager.broadcast({
+    # Broadcast the deletion to the room's Desmos viewers
+    await publish(target, {
         "type": "delete_equation",
         "equation_id": equation_id
     })
@@ -160,13 +432,14 @@ async def delete_equation(equation_id: str):
 
 
 @app.delete("/equations/")
-async def delete_all_equations():
+async def delete_all_equations(room: str = DEFAULT_ROOM):
     """Delete all equations"""
-    count = len(equations)
-    equations.clear()
+    target = get_room(room)
+    count = len(target.equations)
+    target.equations.clear()
 
-    # Broadcast the clear action to all connected Desmos viewers
-    await manager.broadcast({
+    # Broadcast the clear action to the room's Desmos viewers
+    await publish(target, {
         "type": "clear_equations"
     })
 
@@ -175,16 +448,17 @@ async def delete_all_equations():
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time updates to the Desmos viewer"""
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, room: str = DEFAULT_ROOM, since: Optional[int] = None,
+                             epoch: Optional[str] = None):
+    """
+    WebSocket endpoint for real-time updates to the Desmos viewer.
+    Reconnecting viewers pass the last version they saw as ?since= (with the
+    room's ?epoch= from their init message) and receive only the changes they
+    missed, or a full snapshot if the log no longer covers them.
+    """
+    target = get_room(room)
+    await manager.connect(websocket, target, since, epoch)
     try:
-        # Send all existing equations to the new connection
-        await websocket.send_json({
-            "type": "init",
-            "equations": [eq.dict() for eq in equations.values()]
-        })
-
         # Keep the connection alive and handle messages
         while True:
             # Wait for messages from the client (could be used for interactive features)
@@ -194,12 +468,16 @@ async def websocket_endpoint(websocket: WebSocket):
                 logger.info(f"Received WebSocket message: {message.get('type', 'unknown')}")
                 # Handle any client messages here if needed
                 # For now, we just echo back
-                await websocket.send_json({"type": "echo", "data": message})
+                manager.send(websocket, {"type": "echo", "data": message})
             except json.JSONDecodeError:
                 logger.error("Received invalid JSON over WebSocket")
-                await websocket.send_json({"type": "error", "message": "Invalid JSON"})
+                manager.send(websocket, {"type": "error", "message": "Invalid JSON"})
     except WebSocketDisconnect:
         logger.info("WebSocket client disconnected")
+    except RuntimeError as e:
+        # Raised when the socket was already closed by the broadcast engine
+        logger.info(f"WebSocket closed: {e}")
+    finally:
         manager.disconnect(websocket)
 
 
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger("desmos-api")
+
+
+class EquationStore:
+    """
+    Storage backend for room equations. This base class keeps nothing and is
+    used when persistence is turned off; SQLiteEquationStore persists to disk.
+
+    Mutations are recorded with the same message dicts that are broadcast to
+    viewers (new_equation, new_equations, delete_equation, clear_equations).
+    """
+
+    # Whether other processes may write to the same store
+    shared = False
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def load_room(self, room_id: str) -> List[dict]:
+        """Equations stored for a room, oldest first"""
+        return []
+
+    def record(self, room_id: str, message: dict):
+        pass
+
+    def latest_seq(self) -> int:
+        """Cursor positioned after every mutation committed so far"""
+        return 0
+
+    def changes_since(self, cursor: int) -> Tuple[int, List[Tuple[str, dict]]]:
+        """Mutations written by other processes after `cursor`, and the new cursor"""
+        return cursor, []
+
+
+class SQLiteEquationStore(EquationStore):
+    """
+    SQLite store in WAL mode with write-behind batching. record() only appends
+    to an in-memory buffer, so request latency stays at memory speed; a
+    background task group-commits the buffer every `flush_interval` seconds.
+    Anything still buffered when the process dies is lost, so keep the interval short.
+
+    Every commit also appends the mutations to a log table that other uvicorn
+    workers sharing the database tail to keep their rooms and viewers in sync.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, flush_interval: float = 0.05, log_retention: float = 300):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.log_retention = log_retention
+        self.origin = uuid.uuid4().hex
+        self.pending: List[Tuple[str, str, str]] = []
+        self.flusher: Optional[asyncio.Task] = None
+        # The connection is shared by the event loop (reads) and the flush thread (writes)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS equations (
+                room TEXT NOT NULL,
+                id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (room, id)
+            );
+            CREATE TABLE IF NOT EXISTS mutations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                room TEXT NOT NULL,
+                message TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        self.db.commit()
+
+    async def start(self):
+        self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.flusher is not None:
+            self.flusher.cancel()
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Error flushing equation store: {e}")
+
+    async def flush(self):
+        """Group-commit everything buffered so far in one transaction"""
+        # Swapped on the event loop so record() never races with the writer thread
+        batch, self.pending = self.pending, []
+        if batch:
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                # The transaction was rolled back; keep the batch ahead of anything recorded since
+                self.pending = batch + self.pending
+                raise
+
+    def load_room(self, room_id: str) -> List[dict]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT data FROM equations WHERE room = ? ORDER BY position", (room_id,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def record(self, room_id: str, message: dict):
+        # Serialized now, before the broadcast stamps a worker-local version on the message
+        self.pending.append((room_id, message["type"], json.dumps(message)))
+
+    def _write(self, batch: List[Tuple[str, str, str]]):
+        now = time.time()
+        with self.lock, self.db:
+            for room_id, message_type, text in batch:
+                self._apply(room_id, message_type, json.loads(text))
+            self.db.executemany(
+                "INSERT INTO mutations (origin, room, message, created_at) VALUES (?, ?, ?, ?)",
+                [(self.origin, room_id, text, now) for room_id, _, text in batch]
+            )
+            self.db.execute("DELETE FROM mutations WHERE created_at < ?", (now - self.log_retention,))
+        logger.info(f"Committed {len(batch)} equation mutations")
+
+    def _apply(self, room_id: str, message_type: str, message: dict):
+        if message_type in ("new_equation", "new_equations"):
+            new_equations = message["equations"] if message_type == "new_equations" else [message["equation"]]
+            for equation in new_equations:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO equations (room, id, position, data) VALUES ("
+                    "?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM equations WHERE room = ?), ?)",
+                    (room_id, equation["id"], room_id, json.dumps(equation))
+                )
+        elif message_type == "delete_equation":
+            self.db.execute("DELETE FROM equations WHERE room = ? AND id = ?", (room_id, message["equation_id"]))
+        elif message_type == "clear_equations":
+            self.db.execute("DELETE FROM equations WHERE room = ?", (room_id,))
+
+    def latest_seq(self) -> int:
+        with self.lock:
+            row = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM mutations").fetchone()
+        return row[0]
+
+    def changes_since(self, cursor: int) -> Tuple[int, List[Tuple[str, dict]]]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT seq, origin, room, message FROM mutations WHERE seq > ? ORDER BY seq", (cursor,)
+            ).fetchall()
+        changes = [(room_id, json.loads(text)) for _, origin, room_id, text in rows if origin != self.origin]
+        return (rows[-1][0] if rows else cursor), changes
+
+
+def create_store() -> EquationStore:
+    """Pick the storage backend from EQUATION_STORE (sqlite or memory)"""
+    backend = os.getenv("EQUATION_STORE", "sqlite")
+    if backend == "memory":
+        logger.info("Equations are kept in memory only")
+        return EquationStore()
+
+    path = os.getenv("EQUATION_DB_PATH", "equations.sqlite3")
+    flush_interval = float(os.getenv("EQUATION_STORE_FLUSH_INTERVAL", "0.05"))
+    logger.info(f"Persisting equations to {path}")
+    return SQLiteEquationStore(path, flush_interval)
@@ -0,0 +1,29 @@
+import os
+
+os.environ["EQUATION_STORE"] = "memory"
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+def test_batch_applies_valid_equations_and_reports_invalid_ones():
+    batch = [
+        {"expression": "y=x^2", "label": "Parabola"},
+        {"expression": "   "},
+        {"label": "No expression"},
+        {"expression": "y=\\sin(x)"},
+        "not an equation",
+    ]
+    response = client.post("/equations/batch", json=batch, params={"room": "mixed-batch"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert [eq["expression"] for eq in result["equations"]] == ["y=x^2", "y=\\sin(x)"]
+    assert [error["index"] for error in result["errors"]] == [1, 2, 4]
+    assert result["errors"][0]["detail"] == "Expression cannot be empty"
+
+    stored = client.get("/equations/", params={"room": "mixed-batch"}).json()
+    assert sorted(eq["expression"] for eq in stored) == ["y=\\sin(x)", "y=x^2"]
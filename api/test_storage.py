@@ -0,0 +1,37 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from storage import SQLiteEquationStore
+
+
+def new_equation(equation_id, expression):
+    return {"type": "new_equation", "equation": {"id": equation_id, "expression": expression}}
+
+
+def test_failed_write_keeps_batch_for_next_flush(tmp_path, monkeypatch):
+    store = SQLiteEquationStore(str(tmp_path / "equations.sqlite3"))
+    write = store._write
+    calls = []
+
+    def fail_once(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        write(batch)
+
+    monkeypatch.setattr(store, "_write", fail_once)
+
+    async def scenario():
+        store.record("room", new_equation("a", "y=x"))
+        with pytest.raises(sqlite3.OperationalError):
+            await store.flush()
+        store.record("room", new_equation("b", "y=2x"))
+        await store.flush()
+
+    asyncio.run(scenario())
+
+    assert calls == [1, 2]
+    assert store.pending == []
+    assert [data["id"] for data in store.load_room("room")] == ["a", "b"]
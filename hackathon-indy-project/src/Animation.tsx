@@ -7,6 +7,7 @@ export default function Animation() {
   const [error, setError] = useState(null);
   const [jobId, setJobId] = useState(null);
   const [videoUrl, setVideoUrl] = useState(null); // Changed from videoBlob to videoUrl
+  const [progressMessage, setProgressMessage] = useState(null); // Latest stage pushed by the job event stream
   const textareaRef = useRef(null);
   const videoRef = useRef(null);
 
@@ -19,6 +20,7 @@ export default function Animation() {
     setIsLoading(true);
     setError(null);
     setVideoUrl(null); // Reset video URL
+    setProgressMessage(null);
     setJobId(null); // Reset job ID in case of re-sending
 
     // Use XMLHttpRequest instead of fetch
@@ -82,12 +84,14 @@ export default function Animation() {
     }
   };
 
-  // Poll for job status when jobId changes
+  // Follow job progress when jobId changes: the server pushes stage events over SSE,
+  // and polling /job-status is only used if the event stream can't be opened
   useEffect(() => {
     if (!jobId) return;
 
     let isCancelled = false; // Flag to prevent state updates after cancellation
     let timeoutId = null;
+    let eventSource = null;
 
     const checkStatus = () => {
       if (isCancelled) return; // Stop polling if cancelled
@@ -109,11 +113,9 @@ export default function Animation() {
 
               if (currentStatus === "success") {
                 console.log("Job completed successfully. Setting video URL.");
-                // --- CHANGE HERE ---
-                // Construct the direct URL to the video file served from port 5556
-                const timestamp = Date.now(); // Add timestamp to prevent caching issues
-                const url = `http://localhost:5556/temp.mp4?t=${timestamp}`;
-                // --- END CHANGE ---
+                // Each job's video has its own content-hashed URL on the port 5556 server,
+                // so it can be cached by the browser without a cache-busting timestamp
+                const url = statusData.video_url;
                 console.log("Setting video source to:", url);
 
                 setVideoUrl(url); // Set the direct URL
@@ -156,12 +158,47 @@ export default function Animation() {
       xhr.send();
     };
 
-    checkStatus(); // Start the first check
+    if (typeof EventSource !== "undefined") {
+      eventSource = new EventSource(`http://localhost:5555/job-events/${jobId}`);
+
+      eventSource.addEventListener("progress", (e) => {
+        if (isCancelled) return;
+        const event = JSON.parse(e.data);
+        console.log(`Job ${event.stage} after ${event.elapsed}s:`, event.message);
+
+        if (event.stage === "done") {
+          eventSource.close();
+          setVideoUrl(event.video_url);
+          setIsLoading(false);
+          setJobId(null);
+        } else if (event.stage === "error") {
+          eventSource.close();
+          setError(event.message || "Video generation failed on the server");
+          setIsLoading(false);
+          setJobId(null);
+        } else {
+          setProgressMessage(event.message);
+        }
+      });
+
+      eventSource.onerror = () => {
+        if (isCancelled) return;
+        // The browser would keep reconnecting; fall back to polling instead
+        console.warn("Job event stream failed, falling back to polling");
+        eventSource.close();
+        checkStatus();
+      };
+    } else {
+      checkStatus(); // Start the first check
+    }
 
     // Cleanup function: This runs when jobId changes or the component unmounts
     return () => {
-      console.log("Cleaning up polling effect for job ID:", jobId);
+      console.log("Cleaning up job progress effect for job ID:", jobId);
       isCancelled = true; // Set the flag to stop any ongoing XHR/timeouts
+      if (eventSource) {
+        eventSource.close();
+      }
       if (timeoutId) {
         clearTimeout(timeoutId); // Clear any pending timeout
       }
@@ -182,6 +219,7 @@ export default function Animation() {
             <div className="w-full h-full flex flex-col items-center justify-center gap-2">
               <div className="animate-spin rounded-full h-16 w-16 border-t-2 border-b-2 border-primary"></div>
               <p className="text-white mt-8">Generating video...</p> {/* Added margin for separation */}
+              {progressMessage && <p className="text-gray-400 text-sm">{progressMessage}</p>}
             </div>
           ) : error ? (
             <div className="w-full h-full flex items-center justify-center text-red-500 p-4 text-center">
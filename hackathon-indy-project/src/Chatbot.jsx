@@ -6,6 +6,7 @@ import rehypeKatex from 'rehype-katex';
 import 'katex/dist/katex.min.css';
 import './Chatbot.css';
 import Screenshot from "./Screenshot.tsx"
+import { getConversationId } from "./conversation";
 
 const API_BASE_URL = 'http://localhost:8000';
 const DESMOS_API_URL = 'http://localhost:8001';
@@ -474,25 +475,6 @@ const extractGraphs = (content) => {
   }
 };
 
-// Function to send graphs to the Desmos API
-const sendGraphsToDesmos = async (content) => {
-  try {
-    const response = await fetch(`${API_BASE_URL}/api/extract-graphs`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ content }),
-    });
-
-    const result = await response.json();
-    return result.success;
-  } catch (error) {
-    console.error("Error sending graphs to API:", error);
-    return false;
-  }
-};
-
 // Function to open the Desmos viewer in a new tab/window
 const openDesmosViewer = () => {
   window.open(`${DESMOS_API_URL}/viewer`, '_blank');
@@ -836,14 +818,12 @@ const Chatbot = () => {
       while (streamControllerRef.current.active) {
         const { done, value } = await reader.read();
         if (done) {
-          // Check for graphs in the accumulated content before completing
+          // The chat server pushes graph blocks to Desmos as they stream in,
+          // so we only need to flag the message here
           const hasGraphs = extractGraphs(accumulated) !== null;
 
           if (hasGraphs) {
-            const success = await sendGraphsToDesmos(accumulated);
-            if (success) {
-              setMessagesWithGraphs(prev => new Set([...prev, botMessageId]));
-            }
+            setMessagesWithGraphs(prev => new Set([...prev, botMessageId]));
           }
 
           // Normal completion
@@ -966,7 +946,7 @@ const Chatbot = () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ message: userMessage.content }),
+        body: JSON.stringify({ message: userMessage.content, conversation_id: getConversationId() }),
         signal,
       });
 
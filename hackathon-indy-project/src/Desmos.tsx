@@ -1,4 +1,5 @@
 import { useEffect, useState, useRef } from 'react';
+import { getConversationId } from './conversation';
 
 interface Equation {
   id: string;
@@ -34,6 +35,8 @@ declare global {
 }
 
 const EQUATIONS_API_URL = 'http://localhost:8001';
+// Graphs from this tab's chat are drawn in the Desmos room named after its conversation
+const ROOM_ID = encodeURIComponent(getConversationId());
 
 export default function Desmos() {
   const calculatorRef = useRef<any>(null);
@@ -41,6 +44,9 @@ export default function Desmos() {
   const [equations, setEquations] = useState<Equation[]>([]);
   const [error, setError] = useState<string | null>(null);
   const wsRef = useRef<WebSocket | null>(null);
+  // Last room version applied; sent on reconnect so the server only replays what we missed
+  const lastVersionRef = useRef<number | null>(null);
+  const epochRef = useRef<string | null>(null);
   const [lastAction, setLastAction] = useState<string>('');
 
   // Initialize the Desmos calculator
@@ -113,7 +119,7 @@ export default function Desmos() {
   const fetchEquations = async () => {
     try {
       console.log("Fetching initial equations...");
-      const response = await fetch(`${EQUATIONS_API_URL}/equations/`);
+      const response = await fetch(`${EQUATIONS_API_URL}/equations/?room=${ROOM_ID}`);
 
       if (response.ok) {
         const data: Equation[] = await response.json();
@@ -140,7 +146,10 @@ export default function Desmos() {
   // Connect to WebSocket for real-time updates
   const connectWebSocket = () => {
     console.log("Connecting to WebSocket...");
-    const ws = new WebSocket(`ws://${window.location.hostname}:8001/ws`);
+    const since = lastVersionRef.current !== null && epochRef.current !== null
+      ? `&since=${lastVersionRef.current}&epoch=${epochRef.current}`
+      : '';
+    const ws = new WebSocket(`ws://${window.location.hostname}:8001/ws?room=${ROOM_ID}${since}`);
     wsRef.current = ws;
 
     ws.onopen = () => {
@@ -175,6 +184,12 @@ export default function Desmos() {
         const message = JSON.parse(event.data);
         console.log("Received WebSocket message:", message.type);
         handleWebSocketMessage(message);
+        if (message.type === 'init') {
+          epochRef.current = message.epoch;
+        }
+        if (typeof message.version === 'number') {
+          lastVersionRef.current = message.version;
+        }
       } catch (error) {
         console.error('Error parsing WebSocket message:', error);
       }
@@ -188,6 +203,8 @@ export default function Desmos() {
         // Initial load of equations
         if (message.equations) {
           console.log(`Received initial ${message.equations.length} equations via WebSocket`);
+          // A snapshot replaces whatever we had, e.g. after missing too many updates
+          clearAllEquationsFromCalculator();
           setEquations(message.equations);
 
           // Add each equation to the calculator
@@ -209,6 +226,18 @@ export default function Desmos() {
         }
         break;
 
+      case 'new_equations':
+        // Add a batch of equations sent in one frame
+        if (message.equations) {
+          console.log(`Received ${message.equations.length} new equations via WebSocket`);
+          setEquations(prev => [...prev, ...message.equations]);
+          message.equations.forEach((equation: Equation) => {
+            addEquationToCalculator(equation);
+          });
+          setLastAction(`Added ${message.equations.length} equations`);
+        }
+        break;
+
       case 'delete_equation':
         // Remove an equation
         if (message.equation_id) {
@@ -2,6 +2,7 @@ import { useState, useRef, useEffect } from 'react';
 import html2canvas from 'html2canvas';
 import { toast } from 'react-hot-toast';
 import selectIcon from './assets/icons/selection.svg';
+import { getConversationId } from './conversation';
 import './screenshot.css';
 
 export default function Screenshot({ activeTab }: { activeTab: string}) {
@@ -314,14 +315,14 @@ currentPageCanvas as HTMLCanvasElement,
       console.log('Attempting to send image to server...');
 
       try {
-        // Update the fetch URL to include the server port
-        const response = await fetch('http://localhost:4444/api/save-image', {
+        // Attach the screenshot to this tab's conversation on the chat server
+        const response = await fetch('http://localhost:8000/api/attachments', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
             'Accept': 'application/json'
           },
-          body: JSON.stringify({ imageData: image }),
+          body: JSON.stringify({ conversation_id: getConversationId(), image_data: image }),
         });
 
         console.log('Server response status:', response.status);
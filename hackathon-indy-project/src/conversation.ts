@@ -0,0 +1,12 @@
+// Identifies this browser tab's conversation so the chat server only picks up
+// the screenshots captured here, not other users' uploads.
+const CONVERSATION_ID_KEY = 'phantasia-conversation-id';
+
+export const getConversationId = (): string => {
+  let conversationId = sessionStorage.getItem(CONVERSATION_ID_KEY);
+  if (!conversationId) {
+    conversationId = crypto.randomUUID();
+    sessionStorage.setItem(CONVERSATION_ID_KEY, conversationId);
+  }
+  return conversationId;
+};
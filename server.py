@@ -1,10 +1,11 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, field_validator
 import asyncio
 import traceback
 import httpx
@@ -12,13 +13,41 @@ import re
 import json
 from pathlib import Path
 import base64
-from typing import List
+import binascii
+import hashlib
+import sqlite3
+import threading
+import io
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 load_dotenv()
 DEEPSEEKAPIKEY = os.getenv("DEEPSEEKAPIKEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional override, e.g. a local fake upstream for benchmarking (see testing/chat_stream_benchmark.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+# Maximum number of chat completions streamed concurrently by this process
+CHAT_MAX_CONCURRENT_STREAMS = int(os.getenv("CHAT_MAX_CONCURRENT_STREAMS", "256"))
+# Seconds a request may wait for a free stream slot before it is rejected with 503
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))
 if not DEEPSEEKAPIKEY:
     print("Warning: DEEPSEEKAPIKEY environment variable not set, using hardcoded key.")
+if Image is None:
+    print("Warning: Pillow is not installed, images will be sent to the model without preprocessing.")
 
 app = FastAPI(
     title="Streaming Chat API",
@@ -36,120 +65,713 @@ app.add_middleware(
 
 # OPENAI_BASE_URL = "https://api.deepseek.com/v1"
 
-# Initialize OpenAI client
+# Initialize OpenAI client. The async client streams on the event loop, so a slow
+# completion no longer blocks other chats, /health or /stop.
 try:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 
 except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
 
 active_generations = {}
 
+# Bounds the number of in-flight upstream streams; requests beyond the limit queue here
+chat_stream_slots = asyncio.Semaphore(CHAT_MAX_CONCURRENT_STREAMS)
+
+
+async def acquire_chat_stream_slot():
+    """Wait for a free stream slot, rejecting the request with 503 if the queue is too slow"""
+    try:
+        await asyncio.wait_for(chat_stream_slots.acquire(), timeout=CHAT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Rejecting chat request: all {CHAT_MAX_CONCURRENT_STREAMS} stream slots busy")
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent chat streams, please retry shortly",
+            headers={"Retry-After": str(max(1, int(CHAT_QUEUE_TIMEOUT)))}
+        )
+
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            chat_stream_slots.release()
+
+    return release
+
+
+SYSTEM_PROMPT = """
+                You are a helpful assistant that can answer questions and help with tasks.
+                You are also able to use LaTeX to render mathematical expressions. However, avoid Tkiz diagrams. We can't compile them.
+
+                When a user asks you to graph something or plot a function, you should provide the equations in a format that can be plotted.
+                Use LaTeX syntax for the equations. For graphable content, include a special section at the end of your response like this:
+
+                ```graph
+                [
+                  {
+                    "expression": "x^2",
+                    "label": "Parabola",
+                    "color": "#FF0000"
+                  },
+                  {
+                    "expression": "\\\\sin(x)",
+                    "label": "Sine Wave",
+                    "color": "#0000FF"
+                  }
+                ]
+                ```
+
+                The expression should use LaTeX syntax. Make sure to properly escape backslashes in LaTeX expressions.
+                Always use these colors for different functions: #FF0000 (red), #0000FF (blue), #00FF00 (green), 
+                #800080 (purple), #FFA500 (orange), #008080 (teal).
+
+                We'll be rendering these graphs in Desmos, so make sure to use the correct syntax for Desmos. 
+                Take special note of \\\\sin(x) and \\\\cos(x) as these are the correct ways to write the sine and cosine functions for Desmos.
+                If an equation has no variables, then write y=equation.
+                For example, if the equation is 2, then write y=2.
+
+                If the user has sent images, analyze them and provide insights based on their visual content.
+                """
+# Part of every response cache key, so editing the prompt invalidates cached answers
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+# SHA-256 hex digest naming an attachment in the store
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
 
 class ChatRequest(BaseModel):
     message: str
+    # Ties the chat to the attachments uploaded for this conversation
+    conversation_id: Optional[str] = None
+    # Explicit attachment hashes returned by /api/attachments
+    attachments: Optional[List[str]] = None
+
+    @field_validator("attachments")
+    @classmethod
+    def check_attachment_hashes(cls, attachments):
+        # Hashes become file names in the attachment store, so anything else could point outside it
+        for digest in attachments or []:
+            if not DIGEST_PATTERN.match(digest):
+                raise HTTPException(status_code=400, detail=f"Invalid attachment hash: {digest!r}")
+        return attachments
 
 
 class GraphRequest(BaseModel):
     content: str
+    # Selects the Desmos room the graphs are sent to
+    conversation_id: Optional[str] = None
+
+
+class AttachmentRequest(BaseModel):
+    conversation_id: str
+    image_data: str  # data URL, e.g. "data:image/png;base64,..."
+
+
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+}
+EXTENSIONS = {mime: ext for ext, mime in reversed(list(MIME_TYPES.items()))}
+
+# Screenshots written by the Node server's /api/save-image (path relative to where the server is running)
+LEGACY_UPLOAD_DIR = Path("hackathon-indy-project/uploads")
+ATTACHMENT_STORE_DIR = Path(os.getenv("ATTACHMENT_STORE_DIR", "hackathon-indy-project/uploads/store"))
+# Disk budget for stored attachments; the least recently used files are pruned past this
+ATTACHMENT_STORE_MAX_BYTES = int(os.getenv("ATTACHMENT_STORE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Memory budget for encoded data URLs kept ready for reuse
+ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("ATTACHMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Images are downscaled so their longest side is at most this many pixels
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1568"))
+# WEBP or JPEG
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "WEBP").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+# Images whose perceptual hashes differ by at most this many bits count as duplicates
+IMAGE_DEDUP_DISTANCE = int(os.getenv("IMAGE_DEDUP_DISTANCE", "4"))
+
+# Image decoding, resizing and base64 encoding run here so they never block the event loop
+image_executor = ThreadPoolExecutor(max_workers=int(os.getenv("IMAGE_WORKERS", "4")), thread_name_prefix="image")
+
+
+async def run_in_image_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(image_executor, func, *args)
+
+
+def preprocess_image(data: bytes, mime_type: str):
+    """
+    Downscale and recompress an image for the vision model.
+    Returns (data, mime type); the original is kept if recompression doesn't make it smaller.
+    """
+    if Image is None or mime_type == 'image/gif':
+        return data, mime_type
+
+    start = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            if IMAGE_OUTPUT_FORMAT == "JPEG":
+                img = img.convert("RGB")
+                out_mime = 'image/jpeg'
+            else:
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+                out_mime = 'image/webp'
+            buffer = io.BytesIO()
+            img.save(buffer, format=IMAGE_OUTPUT_FORMAT, quality=IMAGE_QUALITY)
+    except Exception as e:
+        print(f"Error preprocessing image, sending original: {e}")
+        return data, mime_type
 
+    processed = buffer.getvalue()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if len(processed) >= len(data):
+        print(f"Recompression did not shrink image ({len(data)} bytes), keeping original ({elapsed_ms:.1f} ms)")
+        return data, mime_type
 
-# Update the get_image_files_from_uploads function to add more debugging and handle the path correctly
+    print(f"Preprocessed image: {len(data)} -> {len(processed)} bytes "
+          f"({len(data) - len(processed)} saved) in {elapsed_ms:.1f} ms")
+    return processed, out_mime
 
-def get_image_files_from_uploads() -> List[str]:
-    """Scan the uploads directory for image files with enhanced debugging"""
-    image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-    upload_dir = Path("hackathon-indy-project/uploads")  # Path relative to where the server is running
 
-    # Debug message
-    print(f"Looking for images in: {upload_dir.absolute()}")
+def perceptual_hash(data: bytes) -> Optional[int]:
+    """64-bit difference hash; near-identical screenshots differ in only a few bits"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            pixels = list(img.convert("L").resize((9, 8)).getdata())
+    except Exception as e:
+        print(f"Error computing perceptual hash: {e}")
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+class AttachmentStore:
+    """
+    Content-addressed image store. Files live on disk under their SHA-256 hash,
+    are queued per conversation until the next chat consumes them, and their
+    data URLs are encoded once and kept in an LRU cache.
+    """
+
+    def __init__(self, root: Path, max_disk_bytes: int, max_cache_bytes: int):
+        self.root = root
+        self.max_disk_bytes = max_disk_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self.pending: Dict[str, List[str]] = {}
+        # Per-hash preprocessing stats and perceptual hash, kept for the life of the process
+        self.meta: Dict[str, dict] = {}
+        self.data_urls: "OrderedDict[str, str]" = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Optional[Path]:
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"Invalid attachment hash: {digest!r}")
+        for ext in EXTENSIONS.values():
+            candidate = self.root / f"{digest}{ext}"
+            if candidate.exists():
+                return candidate
+        return None
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """
+        Store image bytes and return their hash. Identical bytes are stored once,
+        downscaled and recompressed on the way in.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        self.root.mkdir(parents=True, exist_ok=True)
+        existing = self.path_for(digest)
+        if existing is not None:
+            os.utime(existing)
+            return digest
+
+        start = time.perf_counter()
+        processed, processed_mime = preprocess_image(data, mime_type)
+        meta = {
+            "original_bytes": len(data),
+            "stored_bytes": len(processed),
+            "encode_ms": (time.perf_counter() - start) * 1000,
+            "phash": perceptual_hash(processed),
+        }
+        with self.lock:
+            self.meta[digest] = meta
+
+        path = self.root / f"{digest}{EXTENSIONS.get(processed_mime, '.png')}"
+        # Identical uploads can be stored concurrently, so each writes its own temp file
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(processed)
+        os.replace(tmp_path, path)
+        self.prune()
+        return digest
+
+    def phash(self, digest: str) -> Optional[int]:
+        meta = self.meta.get(digest)
+        if meta is None:
+            # Stored by a previous process; hash it lazily
+            path = self.path_for(digest)
+            if path is None:
+                return None
+            meta = {"phash": perceptual_hash(path.read_bytes())}
+            with self.lock:
+                self.meta[digest] = meta
+        return meta.get("phash")
+
+    def attach(self, conversation_id: str, digest: str):
+        with self.lock:
+            queued = self.pending.setdefault(conversation_id, [])
+            if digest not in queued:
+                queued.append(digest)
+
+    def take_pending(self, conversation_id: str) -> List[str]:
+        with self.lock:
+            return self.pending.pop(conversation_id, [])
+
+    def data_url(self, digest: str) -> str:
+        """Return the data URL for a stored image, encoding it only on a cache miss"""
+        with self.lock:
+            cached = self.data_urls.get(digest)
+            if cached is not None:
+                self.data_urls.move_to_end(digest)
+                return cached
+
+        path = self.path_for(digest)
+        if path is None:
+            raise FileNotFoundError(f"Attachment {digest} not found in store")
+        mime_type = MIME_TYPES.get(path.suffix, 'image/jpeg')
+        data_url = f"data:{mime_type};base64,{base64.b64encode(path.read_bytes()).decode('utf-8')}"
+
+        with self.lock:
+            if digest not in self.data_urls:
+                self.data_urls[digest] = data_url
+                self.cache_bytes += len(data_url)
+            while self.cache_bytes > self.max_cache_bytes and len(self.data_urls) > 1:
+                _, evicted = self.data_urls.popitem(last=False)
+                self.cache_bytes -= len(evicted)
+        return data_url
+
+    def prune(self):
+        """Delete the least recently used files once the store exceeds its disk budget"""
+        files = []
+        for entry in os.scandir(self.root):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            # Other threads may be replacing or pruning files in the same directory
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+                print(f"Pruned attachment {path.name} from store")
+            except OSError as e:
+                print(f"Error pruning attachment {path}: {e}")
 
-    # Check if directory exists
-    if not upload_dir.exists():
-        print(f"Warning: Uploads directory does not exist at {upload_dir.absolute()}")
-        os.makedirs(upload_dir, exist_ok=True)
+
+attachment_store = AttachmentStore(ATTACHMENT_STORE_DIR, ATTACHMENT_STORE_MAX_BYTES, ATTACHMENT_CACHE_MAX_BYTES)
+
+
+def ingest_legacy_uploads() -> List[str]:
+    """
+    Move screenshots dropped into the shared uploads directory into the attachment
+    store and return their hashes. Files are removed as they are ingested, so
+    the directory never accumulates stale images.
+    """
+    if not LEGACY_UPLOAD_DIR.exists():
         return []
 
-    # Get all files with image extensions
-    image_files = []
-    for ext in image_extensions:
-        found_files = list(upload_dir.glob(f"*{ext}"))
-        if found_files:
-            print(f"Found {len(found_files)} files with extension {ext}")
-        image_files.extend(found_files)
-
-    # Return full paths as strings
-    file_paths = [str(img_path) for img_path in image_files]
-
-    # Debug output
-    if file_paths:
-        print(f"Found {len(file_paths)} image files in uploads directory:")
-        for path in file_paths:
-            print(f"  - {path}")
+    digests = []
+    with os.scandir(LEGACY_UPLOAD_DIR) as entries:
+        for entry in entries:
+            ext = Path(entry.name).suffix.lower()
+            if not entry.is_file() or ext not in MIME_TYPES:
+                continue
+            try:
+                data = Path(entry.path).read_bytes()
+                digests.append(attachment_store.put(data, MIME_TYPES[ext]))
+                os.remove(entry.path)
+                print(f"Ingested legacy upload {entry.name}")
+            except OSError as e:
+                print(f"Error ingesting legacy upload {entry.path}: {e}")
+    return digests
+
+
+def parse_data_url(image_data: str):
+    """Split a base64 data URL into (mime type, raw bytes)"""
+    match = re.match(r"^data:(image/[\w.+-]+);base64,(.*)$", image_data, re.DOTALL)
+    if not match or match.group(1) not in EXTENSIONS:
+        raise ValueError("Expected a base64 encoded image data URL")
+    return match.group(1), base64.b64decode(match.group(2), validate=True)
+
+
+def resolve_attachments(chat_req: ChatRequest) -> List[str]:
+    """Collect the attachment hashes that belong to this chat request"""
+    digests = list(chat_req.attachments or [])
+    if chat_req.conversation_id:
+        digests.extend(attachment_store.take_pending(chat_req.conversation_id))
     else:
-        print("No image files found in uploads directory")
+        # Older clients still save screenshots through the Node server
+        digests.extend(ingest_legacy_uploads())
+    return list(dict.fromkeys(digests))
+
+
+def drop_near_duplicates(digests: List[str]) -> List[str]:
+    """Keep only the first of any images whose perceptual hashes are within IMAGE_DEDUP_DISTANCE bits"""
+    kept = []
+    kept_hashes = []
+    for digest in digests:
+        phash = attachment_store.phash(digest)
+        if phash is not None and any(bin(phash ^ other).count("1") <= IMAGE_DEDUP_DISTANCE for other in kept_hashes):
+            print(f"Dropping near-duplicate attachment {digest}")
+            continue
+        kept.append(digest)
+        if phash is not None:
+            kept_hashes.append(phash)
+    return kept
+
+
+def build_image_parts(digests: List[str]) -> List[dict]:
+    """Build the image_url message parts for the given attachment hashes"""
+    parts = []
+    start = time.perf_counter()
+    kept = drop_near_duplicates(digests)
+    for digest in kept:
+        try:
+            parts.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": attachment_store.data_url(digest)
+                }
+            })
+        except Exception as img_err:
+            print(f"Error processing attachment {digest}: {img_err}")
+
+    metas = [attachment_store.meta.get(digest, {}) for digest in kept]
+    original = sum(meta.get("original_bytes", 0) for meta in metas)
+    stored = sum(meta.get("stored_bytes", 0) for meta in metas)
+    preprocess_ms = sum(meta.get("encode_ms", 0) for meta in metas)
+    print(f"Prepared {len(parts)} image(s), {len(digests) - len(kept)} duplicate(s) dropped, "
+          f"{original - stored} bytes saved by preprocessing ({preprocess_ms:.1f} ms), "
+          f"{sum(len(part['image_url']['url']) for part in parts)} bytes of data URLs "
+          f"built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return parts
+
+
+@app.post("/api/attachments")
+async def upload_attachment(attachment_req: AttachmentRequest):
+    """Store an image for the next chat message of a conversation"""
+    try:
+        mime_type, data = parse_data_url(attachment_req.image_data)
+    except (ValueError, binascii.Error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return file_paths
+    digest = await run_in_image_executor(attachment_store.put, data, mime_type)
+    attachment_store.attach(attachment_req.conversation_id, digest)
+    print(f"Stored attachment {digest} for conversation {attachment_req.conversation_id}")
+    return {"hash": digest, "bytes": len(data)}
 
 
-def encode_image_to_base64(image_path: str) -> str:
-    """Encode an image file to base64 string with error handling"""
-    # Get file extension and map to MIME type
-    file_ext = Path(image_path).suffix.lower()
-    mime_types = {
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.gif': 'image/gif',
-        '.webp': 'image/webp'
-    }
-    mime_type = mime_types.get(file_ext, 'image/jpeg')  # Default to JPEG if unknown
+DESMOS_API_URL = os.getenv("DESMOS_API_URL", "http://localhost:8001")
 
-    print(f"Encoding image: {image_path} as {mime_type}")
 
+class GraphBlockParser:
+    """
+    Incrementally finds ```graph fenced blocks in streamed text, returning each
+    block's body as soon as its closing fence arrives.
+    """
+    OPEN = "```graph\n"
+    CLOSE = "\n```"
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_block = False
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        blocks = []
+        while True:
+            if not self.in_block:
+                start = self.buffer.find(self.OPEN)
+                if start == -1:
+                    # Keep just enough text to recognise a fence split across chunks
+                    self.buffer = self.buffer[-(len(self.OPEN) - 1):]
+                    return blocks
+                self.buffer = self.buffer[start + len(self.OPEN):]
+                self.in_block = True
+
+            end = self.buffer.find(self.CLOSE)
+            if end == -1:
+                return blocks
+            blocks.append(self.buffer[:end])
+            self.buffer = self.buffer[end + len(self.CLOSE):]
+            self.in_block = False
+
+
+def parse_graph_block(block: str) -> List[dict]:
+    """Parse the JSON body of a graph block, which may hold one graph or a list of them"""
+    parsed_data = json.loads(block)
+    if isinstance(parsed_data, list):
+        return parsed_data
+    return [parsed_data]
+
+
+# Long-lived, keep-alive connection pool to the Desmos API
+desmos_client = httpx.AsyncClient(
+    base_url=DESMOS_API_URL,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+)
+
+
+@app.on_event("shutdown")
+async def close_desmos_client():
+    await desmos_client.aclose()
+
+
+def desmos_room(conversation_id: Optional[str]) -> str:
+    """Each conversation draws into its own Desmos room"""
+    return conversation_id or "default"
+
+
+async def send_graphs_to_desmos(graphs: List[dict], room: str) -> int:
+    """
+    POST graphs to the Desmos API in one batch request and return how many were
+    accepted. The API adds the valid graphs and reports the others by index.
+    """
+    if not graphs:
+        return 0
     try:
-        # Encode file to base64
-        with open(image_path, "rb") as image_file:
-            file_data = image_file.read()
-            print(f"Successfully read {len(file_data)} bytes from {image_path}")
-            base64_data = base64.b64encode(file_data).decode('utf-8')
-            return f"data:{mime_type};base64,{base64_data}"
+        response = await desmos_client.post("/equations/batch", json=graphs, params={"room": room})
     except Exception as e:
-        print(f"Error encoding image {image_path}: {e}")
-        raise
+        print(f"Error sending graphs to Desmos API: {str(e)}")
+        return 0
 
+    if response.status_code != 200:
+        print(f"Error sending graphs to Desmos API: {response.status_code} - {response.text}")
+        return 0
+    result = response.json()
+    for error in result["errors"]:
+        print(f"Desmos API rejected graph {error['index']} ({graphs[error['index']]!r}): {error['detail']}")
+    return len(result["equations"])
+
+
+# Keeps in-flight graph pushes referenced until they finish
+graph_push_tasks = set()
+
+
+def push_graph_blocks(blocks: List[str], request_id, room: str):
+    """Send completed graph blocks to Desmos in the background so streaming isn't held up"""
+    for block in blocks:
+        try:
+            graphs = parse_graph_block(block)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing streamed graph block for request {request_id}: {e}")
+            continue
+        print(f"Pushing {len(graphs)} graph(s) to Desmos mid-stream for request {request_id}")
+        task = asyncio.create_task(send_graphs_to_desmos(graphs, room))
+        graph_push_tasks.add(task)
+        task.add_done_callback(graph_push_tasks.discard)
+
+
+# Chat response cache settings
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "1") == "1"
+CHAT_CACHE_PATH = os.getenv("CHAT_CACHE_PATH", "chat_cache.sqlite3")
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", str(24 * 60 * 60)))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "5000"))
+# Cosine similarity needed for a semantic hit; unset disables the embedding tier
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0") or 0)
+CHAT_CACHE_EMBEDDING_MODEL = os.getenv("CHAT_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+# Most recently used embeddings compared per semantic lookup
+CHAT_CACHE_SEMANTIC_SCAN_LIMIT = int(os.getenv("CHAT_CACHE_SEMANTIC_SCAN_LIMIT", "2000"))
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.lower().split())
 
-def encode_image_to_base64(image_path: str) -> str:
-    """Encode an image file to base64 string with appropriate MIME type"""
-    # Get file extension and map to MIME type
-    file_ext = Path(image_path).suffix.lower()
-    mime_types = {
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.gif': 'image/gif',
-        '.webp': 'image/webp'
-    }
-    mime_type = mime_types.get(file_ext, 'image/jpeg')  # Default to JPEG if unknown
-
-    # Encode file to base64
-    with open(image_path, "rb") as image_file:
-        base64_data = base64.b64encode(image_file.read()).decode('utf-8')
-
-    return f"data:{mime_type};base64,{base64_data}"
-
-
-def cleanup_uploads_directory():
-    """Delete all files in the uploads directory"""
-    upload_dir = Path("uploads")
-    if upload_dir.exists():
-        for file_path in upload_dir.iterdir():
-            if file_path.is_file():
-                try:
-                    file_path.unlink()
-                    print(f"Deleted file: {file_path}")
-                except Exception as e:
-                    print(f"Error deleting file {file_path}: {e}")
+
+class ResponseCache:
+    """
+    SQLite-backed cache of completed chat responses, stored as the list of
+    chunks the model streamed so hits can be replayed chunk by chunk.
+    Entries expire after `ttl` seconds and the least recently used are evicted
+    past `max_entries`. An optional embedding tier matches paraphrased questions.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int, similarity: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                chunks TEXT NOT NULL,
+                embedding BLOB,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+        self.db.commit()
+
+    @staticmethod
+    def scope_for(image_digests: List[str]) -> str:
+        """Entries are only comparable under the same system prompt and images"""
+        return SYSTEM_PROMPT_VERSION + ":" + ",".join(sorted(image_digests))
+
+    @staticmethod
+    def key_for(message: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\n{normalize_message(message)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT chunks FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+        return json.loads(row[0])
+
+    def get_similar(self, scope: str, embedding: List[float]) -> Optional[List[str]]:
+        """
+        Return the cached response whose embedding is closest to `embedding`, if
+        above the threshold. Only the CHAT_CACHE_SEMANTIC_SCAN_LIMIT most recently
+        used entries are compared, in one matrix-vector product when numpy is available.
+        """
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT key, embedding FROM responses "
+                "WHERE scope = ? AND embedding IS NOT NULL AND created_at > ? "
+                "ORDER BY last_used DESC LIMIT ?", (scope, now - self.ttl, CHAT_CACHE_SEMANTIC_SCAN_LIMIT)
+            ).fetchall()
+        # Entries embedded by a different model can't be compared
+        rows = [(key, blob) for key, blob in rows if len(blob) == 4 * len(embedding)]
+        if not rows:
+            return None
+
+        if np is not None:
+            matrix = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), -1)
+            scores = matrix @ np.asarray(embedding, dtype=np.float32)
+            best = int(np.argmax(scores))
+            best_key, best_score = rows[best][0], float(scores[best])
+        else:
+            best_key, best_score = None, float("-inf")
+            for key, blob in rows:
+                cached = array("f")
+                cached.frombytes(blob)
+                score = sum(a * b for a, b in zip(embedding, cached))
+                if score > best_score:
+                    best_key, best_score = key, score
+
+        if best_score < self.similarity:
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT chunks FROM responses WHERE key = ?", (best_key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, best_key))
+            self.db.commit()
+        print(f"Semantic cache match with similarity {best_score:.3f}")
+        return json.loads(row[0])
+
+    def put(self, key: str, scope: str, chunks: List[str], embedding: Optional[List[float]] = None):
+        now = time.time()
+        blob = array("f", embedding).tobytes() if embedding else None
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, chunks, embedding, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, scope, json.dumps(chunks), blob, now, now)
+            )
+            evicted = self.db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,)).rowcount
+            evicted += self.db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            ).rowcount
+            self.db.commit()
+            self.stats["stores"] += 1
+            self.stats["evictions"] += evicted
+
+
+response_cache = None
+if CHAT_CACHE_ENABLED:
+    try:
+        response_cache = ResponseCache(CHAT_CACHE_PATH, CHAT_CACHE_TTL, CHAT_CACHE_MAX_ENTRIES, CHAT_CACHE_SIMILARITY)
+    except sqlite3.Error as e:
+        print(f"Error opening chat response cache at {CHAT_CACHE_PATH}, caching disabled: {e}")
+
+
+async def embed_message(message: str) -> Optional[List[float]]:
+    """Unit-length embedding of the normalized message, or None if the semantic tier is off or fails"""
+    if response_cache is None or response_cache.similarity <= 0:
+        return None
+    try:
+        result = await client.embeddings.create(model=CHAT_CACHE_EMBEDDING_MODEL, input=normalize_message(message))
+    except Exception as e:
+        print(f"Error embedding message for semantic cache: {e}")
+        return None
+    vector = result.data[0].embedding
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+async def lookup_cached_response(message: str, image_digests: List[str]):
+    """
+    Check the exact tier, then the semantic tier.
+    Returns (chunks or None, cache key, scope, embedding) so a miss can be stored later.
+    """
+    if response_cache is None:
+        return None, None, None, None
+
+    scope = ResponseCache.scope_for(image_digests)
+    key = ResponseCache.key_for(message, scope)
+    chunks = await asyncio.to_thread(response_cache.get, key)
+    if chunks is not None:
+        response_cache.stats["exact_hits"] += 1
+        return chunks, key, scope, None
+
+    embedding = await embed_message(message)
+    if embedding is not None:
+        chunks = await asyncio.to_thread(response_cache.get_similar, scope, embedding)
+        if chunks is not None:
+            response_cache.stats["semantic_hits"] += 1
+            return chunks, key, scope, embedding
+
+    response_cache.stats["misses"] += 1
+    return None, key, scope, embedding
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the chat response cache"""
+    if response_cache is None:
+        return {"enabled": False}
+    stats = dict(response_cache.stats)
+    lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+    return {"enabled": True, **stats}
 
 
 @app.post("/api/chat")
@@ -158,18 +780,43 @@ async def chat_endpoint(chat_req: ChatRequest, request: Request):
         raise HTTPException(status_code=400, detail="No message provided")
 
     request_id = id(request)
-    active_generations[request_id] = {"active": True, "cancelled": False}
-    print(f"Starting generation for request ID: {request_id}")
 
-    # Check for images in the uploads directory
-    image_files = get_image_files_from_uploads()
-    has_images = len(image_files) > 0
+    # Collect the images attached to this request or conversation
+    image_digests = await run_in_image_executor(resolve_attachments, chat_req)
+    has_images = len(image_digests) > 0
 
     if has_images:
-        print(f"Found {len(image_files)} images to include in request {request_id}")
+        print(f"Found {len(image_digests)} images to include in request {request_id}")
+
+    cached_chunks, cache_key, cache_scope, embedding = await lookup_cached_response(chat_req.message, image_digests)
+    if cached_chunks is not None:
+        print(f"Serving request {request_id} from the response cache ({len(cached_chunks)} chunks)")
+
+        async def replay_generator():
+            graph_parser = GraphBlockParser()
+            for chunk in cached_chunks:
+                push_graph_blocks(graph_parser.feed(chunk), request_id, desmos_room(chat_req.conversation_id))
+                yield chunk
+
+        return StreamingResponse(replay_generator(), media_type="text/plain")
+
+    try:
+        release_slot = await acquire_chat_stream_slot()
+    except HTTPException:
+        # Keep the images queued so the client's retry still sees them
+        if chat_req.conversation_id:
+            for digest in image_digests:
+                attachment_store.attach(chat_req.conversation_id, digest)
+        raise
+
+    active_generations[request_id] = {"active": True, "cancelled": False}
+    print(f"Starting generation for request ID: {request_id}")
 
     async def stream_generator():
         stream = None
+        streamed_chunks = []
+        completed = False
+        graph_parser = GraphBlockParser()
         try:
             # Log the request
             print(f"Sending message to LLM for request {request_id}: {chat_req.message[:100]}...")  # Log snippet
@@ -177,39 +824,7 @@ async def chat_endpoint(chat_req: ChatRequest, request: Request):
             # Prepare system message
             system_message = {
                 "role": "system",
-                "content": """
-                You are a helpful assistant that can answer questions and help with tasks.
-                You are also able to use LaTeX to render mathematical expressions. However, avoid Tkiz diagrams. We can't compile them.
-
-                When a user asks you to graph something or plot a function, you should provide the equations in a format that can be plotted.
-                Use LaTeX syntax for the equations. For graphable content, include a special section at the end of your response like this:
-
-                ```graph
-                [
-                  {
-                    "expression": "x^2",
-                    "label": "Parabola",
-                    "color": "#FF0000"
-                  },
-                  {
-                    "expression": "\\\\sin(x)",
-                    "label": "Sine Wave",
-                    "color": "#0000FF"
-                  }
-                ]
-                ```
-
-                The expression should use LaTeX syntax. Make sure to properly escape backslashes in LaTeX expressions.
-                Always use these colors for different functions: #FF0000 (red), #0000FF (blue), #00FF00 (green), 
-                #800080 (purple), #FFA500 (orange), #008080 (teal).
-
-                We'll be rendering these graphs in Desmos, so make sure to use the correct syntax for Desmos. 
-                Take special note of \\\\sin(x) and \\\\cos(x) as these are the correct ways to write the sine and cosine functions for Desmos.
-                If an equation has no variables, then write y=equation.
-                For example, if the equation is 2, then write y=2.
-
-                If the user has sent images, analyze them and provide insights based on their visual content.
-                """
+                "content": SYSTEM_PROMPT
             }
 
             # Prepare user message
@@ -217,18 +832,8 @@ async def chat_endpoint(chat_req: ChatRequest, request: Request):
                 # Create a message with text and images
                 content = [{"type": "text", "text": chat_req.message}]
 
-                # Add images to content
-                for img_path in image_files:
-                    try:
-                        data_url = encode_image_to_base64(img_path)
-                        content.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": data_url
-                            }
-                        })
-                    except Exception as img_err:
-                        print(f"Error processing image {img_path}: {img_err}")
+                # Add images to content; data URLs come from the attachment cache when possible
+                content.extend(await run_in_image_executor(build_image_parts, image_digests))
 
                 user_message = {
                     "role": "user",
@@ -242,28 +847,34 @@ async def chat_endpoint(chat_req: ChatRequest, request: Request):
                 }
 
             # Create the stream with the prepared messages
-            stream = client.chat.completions.create(
+            stream = await client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[system_message, user_message],
                 stream=True
             )
 
-            for chunk in stream:
+            # Each yield waits for the client to take the chunk, so a slow reader
+            # throttles how fast we pull from upstream instead of buffering
+            async for chunk in stream:
                 if active_generations.get(request_id, {}).get("cancelled", False):
                     print(f"Request {request_id} was cancelled by user.")
                     break
 
+                if not chunk.choices:
+                    continue
                 content = chunk.choices[0].delta.content
                 if content is not None:
+                    streamed_chunks.append(str(content))
+                    push_graph_blocks(graph_parser.feed(str(content)), request_id, desmos_room(chat_req.conversation_id))
                     yield str(content)
-                    await asyncio.sleep(0)
+            else:
+                completed = True
 
             print(f"Finished streaming for request {request_id}.")
 
-            # Cleanup images after successful completion
-            if has_images:
-                cleanup_uploads_directory()
-                print(f"Cleaned up {len(image_files)} images from uploads directory for request {request_id}")
+            # Only complete, uninterrupted answers are worth replaying
+            if completed and streamed_chunks and response_cache is not None:
+                await asyncio.to_thread(response_cache.put, cache_key, cache_scope, streamed_chunks, embedding)
 
         except asyncio.CancelledError:
             print(f"Request {request_id} was cancelled (client disconnected).")
@@ -273,26 +884,22 @@ async def chat_endpoint(chat_req: ChatRequest, request: Request):
             print(f"Error during LLM stream for request {request_id}: {error_details}")
 
         finally:
+            release_slot()
             if request_id in active_generations:
                 del active_generations[request_id]
                 print(f"Cleaned up active generation state for request {request_id}")
             if stream is not None and hasattr(stream, 'close'):
                 try:
-                    stream.close()
+                    await stream.close()
                     print(f"Closed OpenAI stream for request {request_id}")
                 except Exception as close_err:
                     print(f"Error closing stream for request {request_id}: {close_err}")
-            # Ensure images are cleaned up even if there was an error
-            if has_images:
-                try:
-                    cleanup_uploads_directory()
-                    print(f"Cleaned up {len(image_files)} images from uploads directory after error/cancellation")
-                except Exception as cleanup_err:
-                    print(f"Error during image cleanup: {cleanup_err}")
 
     return StreamingResponse(
         stream_generator(),
-        media_type="text/plain"
+        media_type="text/plain",
+        # Frees the slot even if the generator never started (client gone before the first byte)
+        background=BackgroundTask(release_slot)
     )
 
 
@@ -314,14 +921,7 @@ async def extract_graphs(graph_req: GraphRequest):
 
         for match in matches:
             try:
-                # Parse the JSON data from this match
-                parsed_data = json.loads(match)
-
-                # Handle both array and single object formats
-                if isinstance(parsed_data, list):
-                    all_graphs.extend(parsed_data)
-                else:
-                    all_graphs.append(parsed_data)
+                all_graphs.extend(parse_graph_block(match))
             except json.JSONDecodeError as e:
                 print(f"Error parsing graph block: {e}")
                 # Continue with other blocks even if one fails
@@ -330,21 +930,7 @@ async def extract_graphs(graph_req: GraphRequest):
             return {"success": False, "message": "No valid graph data found in the message", "graphs": []}
 
         # Send graphs to the Desmos API
-        graphs_sent = 0
-        async with httpx.AsyncClient() as client:
-            for graph in all_graphs:
-                try:
-                    response = await client.post(
-                        "http://localhost:8001/equations/",
-                        json=graph
-                    )
-
-                    if response.status_code == 200:
-                        graphs_sent += 1
-                    else:
-                        print(f"Error sending graph to Desmos API: {response.status_code} - {response.text}")
-                except Exception as e:
-                    print(f"Error sending individual graph to Desmos API: {str(e)}")
+        graphs_sent = await send_graphs_to_desmos(all_graphs, desmos_room(graph_req.conversation_id))
 
         return {
             "success": True,
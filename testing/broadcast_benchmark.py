@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+import websockets
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    """Run a uvicorn server in a daemon thread and wait until it accepts connections"""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Viewer:
+    """A Desmos viewer stand-in that records when each broadcast equation arrives"""
+
+    def __init__(self, slow_delay=0.0):
+        self.slow_delay = slow_delay
+        self.received = {}
+        self.closed_by_server = False
+        self.ready = asyncio.Event()
+
+    async def run(self, url, stop_event):
+        # A tiny client-side queue makes slow viewers push back on the server instead of buffering
+        async with websockets.connect(url, max_queue=1 if self.slow_delay else 64, open_timeout=60) as ws:
+            await ws.recv()  # init snapshot
+            self.ready.set()
+            try:
+                while not stop_event.is_set():
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    now = time.perf_counter()
+                    message = json.loads(raw)
+                    if message.get("type") == "new_equation":
+                        self.received[message["equation"]["expression"]] = now
+                    if self.slow_delay:
+                        await asyncio.sleep(self.slow_delay)
+            except websockets.ConnectionClosed:
+                self.closed_by_server = True
+
+
+async def run_benchmark(port, clients, slow, slow_delay, broadcasts, payload_bytes, interval):
+    ws_url = f"ws://127.0.0.1:{port}/ws"
+    stop_event = asyncio.Event()
+    viewers = [Viewer(slow_delay if i < slow else 0.0) for i in range(clients)]
+
+    # Connect in waves so the accept backlog isn't overwhelmed
+    tasks = []
+    for start in range(0, clients, 100):
+        wave = viewers[start:start + 100]
+        tasks.extend(asyncio.create_task(viewer.run(ws_url, stop_event)) for viewer in wave)
+        await asyncio.gather(*(viewer.ready.wait() for viewer in wave))
+    print(f"Connected {clients} viewers ({slow} slow)")
+
+    sent_at = {}
+    post_latencies = []
+    padding = "x" * payload_bytes
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        for i in range(broadcasts):
+            expression = f"y={i}x"
+            sent_at[expression] = time.perf_counter()
+            await client.post("/equations/", json={"expression": expression, "label": padding})
+            post_latencies.append(time.perf_counter() - sent_at[expression])
+            await asyncio.sleep(interval)
+
+    # Give fast viewers time to drain
+    await asyncio.sleep(2)
+    stop_event.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    fast_viewers = viewers[slow:]
+    latencies = [
+        viewer.received[expression] - sent
+        for viewer in fast_viewers
+        for expression, sent in sent_at.items()
+        if expression in viewer.received
+    ]
+    expected = len(fast_viewers) * broadcasts
+
+    print("\n" + "-" * 70)
+    print(f"Fast viewers delivered:      {len(latencies)}/{expected}")
+    print(f"Broadcast latency p50:       {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Broadcast latency p99:       {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"Broadcast latency max:       {max(latencies, default=float('nan')) * 1000:.1f} ms")
+    print(f"POST /equations/ p50:        {percentile(post_latencies, 50) * 1000:.1f} ms")
+    print(f"POST /equations/ p99:        {percentile(post_latencies, 99) * 1000:.1f} ms")
+    print(f"Slow viewers disconnected:   {sum(v.closed_by_server for v in viewers[:slow])}/{slow}")
+    print("-" * 70)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Desmos API WebSocket broadcast fan-out")
+    parser.add_argument("--clients", type=int, default=1000,
+                        help="Number of connected viewers")
+    parser.add_argument("--slow", type=int, default=50,
+                        help="How many of the viewers read slowly")
+    parser.add_argument("--slow-delay", type=float, default=1.0,
+                        help="Seconds a slow viewer sleeps after each message")
+    parser.add_argument("--broadcasts", type=int, default=50,
+                        help="Number of equations to broadcast")
+    parser.add_argument("--payload-bytes", type=int, default=16 * 1024,
+                        help="Label padding per equation, to fill slow viewers' socket buffers")
+    parser.add_argument("--interval", type=float, default=0.02,
+                        help="Seconds between broadcasts")
+    parser.add_argument("--queue-size", default=None,
+                        help="Overrides BROADCAST_QUEUE_SIZE")
+    parser.add_argument("--policy", default=None, choices=["disconnect", "drop"],
+                        help="Overrides BROADCAST_OVERFLOW_POLICY")
+
+    args = parser.parse_args()
+
+    # api/main.py reads these at import time
+    os.environ.setdefault("EQUATION_STORE", "memory")
+    if args.queue_size:
+        os.environ["BROADCAST_QUEUE_SIZE"] = args.queue_size
+    if args.policy:
+        os.environ["BROADCAST_OVERFLOW_POLICY"] = args.policy
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+    import logging
+    import main as desmos_api
+    logging.getLogger("desmos-api").setLevel(logging.WARNING)
+
+    port = find_free_port()
+    start_server(desmos_api.app, port)
+    asyncio.run(run_benchmark(port, args.clients, args.slow, args.slow_delay,
+                              args.broadcasts, args.payload_bytes, args.interval))
+
+
+if __name__ == "__main__":
+    main()
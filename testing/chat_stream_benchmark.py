@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_fake_upstream(chunks, chunk_delay):
+    """
+    A minimal stand-in for the OpenAI chat completions endpoint that streams
+    `chunks` SSE events spaced `chunk_delay` seconds apart.
+    """
+    upstream = FastAPI()
+
+    @upstream.post("/v1/chat/completions")
+    async def chat_completions():
+        async def events():
+            for i in range(chunks):
+                payload = {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": "gpt-4o-mini",
+                    "choices": [{"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+                await asyncio.sleep(chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return upstream
+
+
+def start_server(app, port):
+    """Run a uvicorn server in a daemon thread and wait until it accepts connections"""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_stream(client, url, message):
+    """Return (time to first token, list of inter-chunk gaps) for one /api/chat stream"""
+    start = time.perf_counter()
+    first_token = None
+    gaps = []
+    last = None
+    async with client.stream("POST", url, json={"message": message, "conversation_id": "benchmark"}) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"status {response.status_code}")
+        async for _ in response.aiter_raw():
+            now = time.perf_counter()
+            if first_token is None:
+                first_token = now - start
+            else:
+                gaps.append(now - last)
+            last = now
+    return first_token, gaps
+
+
+async def probe_health(client, url, stop_event, latencies):
+    """Hit /health repeatedly while the streams are running to show the loop stays responsive"""
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def run_level(base_url, concurrency, message):
+    limits = httpx.Limits(max_connections=concurrency + 10, max_keepalive_connections=concurrency + 10)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        stop_event = asyncio.Event()
+        health_latencies = []
+        prober = asyncio.create_task(probe_health(client, f"{base_url}/health", stop_event, health_latencies))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *[run_stream(client, f"{base_url}/api/chat", message) for _ in range(concurrency)],
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+
+        stop_event.set()
+        await prober
+
+    failures = [r for r in results if isinstance(r, Exception)]
+    successes = [r for r in results if not isinstance(r, Exception)]
+    ttfts = [ttft for ttft, _ in successes if ttft is not None]
+    gaps = [gap for _, stream_gaps in successes for gap in stream_gaps]
+
+    return {
+        "concurrency": concurrency,
+        "ok": len(successes),
+        "failed": len(failures),
+        "wall_s": elapsed,
+        "ttft_p50_ms": statistics.median(ttfts) * 1000 if ttfts else float("nan"),
+        "ttft_p99_ms": percentile(ttfts, 99) * 1000,
+        "gap_p50_ms": statistics.median(gaps) * 1000 if gaps else float("nan"),
+        "gap_p99_ms": percentile(gaps, 99) * 1000,
+        "health_p99_ms": percentile(health_latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/chat streaming against a local fake upstream")
+    parser.add_argument("--levels", default="1,50,200",
+                        help="Comma separated list of concurrent stream counts")
+    parser.add_argument("--chunks", type=int, default=50,
+                        help="Chunks streamed by the fake upstream per completion")
+    parser.add_argument("--chunk-delay", type=float, default=0.02,
+                        help="Seconds between upstream chunks")
+    parser.add_argument("--message", default="Benchmark message",
+                        help="Message sent to /api/chat")
+
+    args = parser.parse_args()
+
+    upstream_port = find_free_port()
+    server_port = find_free_port()
+
+    # server.py reads these at import time
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{upstream_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    # Measure upstream streaming, not replays from the response cache
+    os.environ.setdefault("CHAT_CACHE_ENABLED", "0")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import server
+
+    start_server(build_fake_upstream(args.chunks, args.chunk_delay), upstream_port)
+    start_server(server.app, server_port)
+
+    base_url = f"http://127.0.0.1:{server_port}"
+    rows = []
+    for level in [int(level) for level in args.levels.split(",")]:
+        print(f"Running {level} concurrent stream(s)...")
+        rows.append(asyncio.run(run_level(base_url, level, args.message)))
+
+    print("\n" + "-" * 100)
+    print(f"{'streams':>8} {'ok':>5} {'failed':>7} {'wall s':>8} {'ttft p50':>10} {'ttft p99':>10} "
+          f"{'gap p50':>9} {'gap p99':>9} {'/health p99':>12}")
+    for row in rows:
+        print(f"{row['concurrency']:>8} {row['ok']:>5} {row['failed']:>7} {row['wall_s']:>8.2f} "
+              f"{row['ttft_p50_ms']:>8.1f}ms {row['ttft_p99_ms']:>8.1f}ms "
+              f"{row['gap_p50_ms']:>7.1f}ms {row['gap_p99_ms']:>7.1f}ms {row['health_p99_ms']:>10.1f}ms")
+    print("-" * 100)
+
+
+if __name__ == "__main__":
+    main()
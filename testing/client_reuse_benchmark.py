@@ -0,0 +1,177 @@
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import ipaddress
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port, ssl_files=None):
+    """Run a uvicorn server in a daemon thread and wait until it accepts connections"""
+    ssl_options = {"ssl_certfile": ssl_files[0], "ssl_keyfile": ssl_files[1]} if ssl_files else {}
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096, **ssl_options)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def self_signed_certificate(directory):
+    """Certificate and key for 127.0.0.1, so the benchmark pays for TLS handshakes like the real APIs"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = Path(directory) / "cert.pem"
+    key_path = Path(directory) / "key.pem"
+    cert_path.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                           serialization.NoEncryption()))
+    return str(cert_path), str(key_path)
+
+
+def stub_app(latency):
+    """Answers DeepSeek (OpenAI-style) and Gemini requests, recording which client connection each came in on"""
+    app = FastAPI()
+    app.state.connections = set()
+    app.state.lock = threading.Lock()
+
+    def record(request):
+        with app.state.lock:
+            app.state.connections.add(tuple(request.scope["client"]))
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        record(request)
+        body = await request.json()
+        time.sleep(latency)
+        return {
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "```python\nprint('stub')\n```"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate_content(version: str, model_action: str, request: Request):
+        record(request)
+        time.sleep(latency)
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": "stub scene plan"}]},
+                                "finishReason": "STOP"}]}
+
+    return app
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_job(combine, get_clients, calls_per_job, latencies):
+    """One video job's worth of LLM traffic: a scene plan from Gemini, then code requests to DeepSeek"""
+    gemini, client = get_clients()
+    started = time.perf_counter()
+    gemini.models.generate_content(model="gemini-2.0-flash", contents="Plan the scenes")
+    latencies.append(time.perf_counter() - started)
+    for _ in range(calls_per_job):
+        started = time.perf_counter()
+        combine.request_code(client, "deepseek-chat", "system", "Write a scene")
+        latencies.append(time.perf_counter() - started)
+
+
+def run_mode(name, combine, app, get_clients, jobs, calls_per_job, concurrency):
+    app.state.connections.clear()
+    latencies = []
+    started = time.perf_counter()
+    # combine.py prints a line per request; keep the report readable
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(run_job, combine, get_clients, calls_per_job, latencies) for _ in range(jobs)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} total {elapsed:6.2f}s  request p50 {percentile(latencies, 50) * 1000:6.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:6.1f} ms  connections opened {len(app.state.connections)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reusing LLM clients across video jobs against a local stub API")
+    parser.add_argument("--jobs", type=int, default=40,
+                        help="Number of simulated video jobs")
+    parser.add_argument("--calls-per-job", type=int, default=4,
+                        help="DeepSeek requests per job (scene code, audio code, retries)")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Jobs running at once")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds the stub waits before answering")
+    parser.add_argument("--no-tls", action="store_true",
+                        help="Serve plain HTTP (no TLS handshake to save)")
+
+    args = parser.parse_args()
+
+    port = find_free_port()
+    app = stub_app(args.latency)
+    scheme = "http"
+    ssl_files = None
+    if not args.no_tls:
+        ssl_files = self_signed_certificate(tempfile.mkdtemp(prefix="client_reuse_"))
+        os.environ["SSL_CERT_FILE"] = ssl_files[0]
+        scheme = "https"
+    start_server(app, port, ssl_files)
+
+    # combine.py reads these at import time
+    os.environ.update({
+        "DEEPSEEKAPIKEY": "stub", "GEMINI_API_KEY": "stub",
+        "DEEPSEEK_BASE_URL": f"{scheme}://127.0.0.1:{port}", "GEMINI_BASE_URL": f"{scheme}://127.0.0.1:{port}",
+        "DEEPSEEK_RATE_LIMIT": "100000", "DEEPSEEK_RATE_BURST": "100000",
+        "GEMINI_RATE_LIMIT": "100000", "GEMINI_RATE_BURST": "100000",
+        "MANIM_WORKERS": "0", "VIDEO_CACHE_ENABLED": "0",
+    })
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video_gen"))
+    import combine
+
+    print(f"{args.jobs} jobs x (1 Gemini + {args.calls_per_job} DeepSeek requests), "
+          f"{args.concurrency} at a time, over {scheme.upper()}, HTTP/2 {'on' if combine.LLM_HTTP2 else 'off'}")
+    # Before: every job (and every overall attempt) built fresh clients with their own connection pools
+    run_mode("new clients per job", combine, app, lambda: combine.ClientRegistry().get(),
+             args.jobs, args.calls_per_job, args.concurrency)
+    run_mode("shared client registry", combine, app, combine.setup_environment,
+             args.jobs, args.calls_per_job, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
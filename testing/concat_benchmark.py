@@ -0,0 +1,81 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video_gen"))
+import combine
+
+
+def make_sample_clips(directory, count, duration):
+    """
+    Render synthetic clips with the same encoding Manim uses for -ql
+    (854x480, 15 fps, H.264, yuv420p) so they can be stream-copied
+    """
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"scene_{i + 1}.mp4")
+        subprocess.run(
+            [combine.FFMPEG_BIN, "-y", "-v", "error",
+             "-f", "lavfi", "-i", f"testsrc=size=854x480:rate=15:duration={duration}",
+             "-c:v", "libx264", "-pix_fmt", "yuv420p", path],
+            check=True
+        )
+        paths.append(path)
+    return paths
+
+
+def time_runs(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare stream-copy concat against re-encoding for scene clips")
+    parser.add_argument("clips", nargs="*",
+                        help="Rendered -ql scene clips to join; synthetic clips are generated when omitted")
+    parser.add_argument("--count", type=int, default=5,
+                        help="Number of synthetic clips to generate")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="Length of each synthetic clip in seconds")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Times to run each method")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        clips = args.clips or make_sample_clips(work_dir, args.count, args.duration)
+        probes = [combine.probe_stream_signature(path) for path in clips]
+        total_duration = sum(duration for _, duration, _ in probes)
+        compatible = all(signature == probes[0][0] for signature, _, _ in probes)
+        print(f"Joining {len(clips)} clips ({total_duration:.1f}s of video), "
+              f"stream copy {'possible' if compatible else 'NOT possible: clips differ'}")
+
+        results = []
+        if compatible:
+            copy_path = os.path.join(work_dir, "copy.mp4")
+            results.append(("stream copy", copy_path,
+                            time_runs(lambda: combine.concat_stream_copy(clips, copy_path), args.repeats)))
+        transcode_path = os.path.join(work_dir, "transcode.mp4")
+        results.append(("re-encode", transcode_path,
+                        time_runs(lambda: combine.concat_transcode(clips, transcode_path, probes), args.repeats)))
+
+        print("\n" + "-" * 70)
+        print(f"{'method':>12} {'median s':>10} {'min s':>8} {'x realtime':>11} {'output MB':>10}")
+        for name, path, timings in results:
+            median = statistics.median(timings)
+            print(f"{name:>12} {median:>10.3f} {min(timings):>8.3f} {total_duration / median:>11.1f} "
+                  f"{os.path.getsize(path) / 1e6:>10.2f}")
+        print("-" * 70)
+
+
+if __name__ == "__main__":
+    main()
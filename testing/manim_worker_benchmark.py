@@ -0,0 +1,87 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video_gen"))
+import combine
+from manim_workers import ManimWorkerPool
+
+TRIVIAL_SCENE = """
+from manim import *
+
+
+class TrivialScene(Scene):
+    def construct(self):
+        self.play(Create(Square()), run_time=0.5)
+"""
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_renders(render, renders, work_dir, label):
+    timings = []
+    for i in range(renders):
+        output_dir = os.path.join(work_dir, f"{label}_{i}")
+        start = time.perf_counter()
+        return_code = render(output_dir)
+        timings.append(time.perf_counter() - start)
+        if return_code != 0:
+            raise RuntimeError(f"{label} render {i + 1} failed with exit code {return_code}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold manim CLI renders against warm worker renders")
+    parser.add_argument("--renders", type=int, default=10,
+                        help="Renders of the trivial scene per method")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "trivial_scene.py")
+        Path(source_path).write_text(TRIVIAL_SCENE)
+
+        def cold(output_dir):
+            return combine.run_manim_subprocess(source_path, output_dir, "TrivialScene",
+                                                combine.ManimProgressParser(combine.no_progress))
+
+        pool = ManimWorkerPool(1, max_jobs=args.renders + 1, render_timeout=600)
+
+        def warm(output_dir):
+            return_code, error_output = pool.render(source_path, output_dir, "TrivialScene", lambda text: None)
+            if return_code != 0:
+                print(error_output)
+            return return_code
+
+        print("Rendering with the manim CLI...")
+        cold_timings = time_renders(cold, args.renders, work_dir, "cold")
+
+        # The first warm render includes starting the worker and importing Manim
+        print("Starting a warm worker...")
+        start = time.perf_counter()
+        time_renders(warm, 1, work_dir, "startup")
+        startup = time.perf_counter() - start
+        print("Rendering on the warm worker...")
+        warm_timings = time_renders(warm, args.renders, work_dir, "warm")
+        pool.shutdown()
+
+    print("\n" + "-" * 60)
+    print(f"{'method':>14} {'p50 s':>8} {'p95 s':>8} {'mean s':>8}")
+    for name, timings in (("cold cli", cold_timings), ("warm worker", warm_timings)):
+        print(f"{name:>14} {statistics.median(timings):>8.3f} {percentile(timings, 95):>8.3f} "
+              f"{statistics.mean(timings):>8.3f}")
+    print("-" * 60)
+    print(f"First render on a new worker (process start + Manim import): {startup:.3f}s")
+    print(f"Warm renders save {statistics.median(cold_timings) - statistics.median(warm_timings):.3f}s each (p50)")
+
+
+if __name__ == "__main__":
+    main()
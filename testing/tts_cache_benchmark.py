@@ -0,0 +1,109 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCENE_TEMPLATE = '''
+from manim import *
+from manim_voiceover import VoiceoverScene
+from manim_voiceover.services.elevenlabs import ElevenLabsService
+
+
+class NarratedScene(VoiceoverScene):
+    def construct(self):
+        self.set_speech_service(ElevenLabsService(voice_name="Adam", voice_settings={{"stability": 0.1, "similarity_boost": 0.3}}))
+        title = Text("TTS cache", font_size=30)
+{blocks}
+'''
+
+BLOCK_TEMPLATE = '''        with self.voiceover(text="Narration line {n} about the topic of this scene.") as tracker:
+            self.play(Write(title), run_time=tracker.duration)
+            self.play(FadeOut(title))
+'''
+
+
+def narration_texts(lines):
+    return [f"Narration line {n} about the topic of this scene." for n in range(lines)]
+
+
+def synthesize_only(renders, lines, work_dir):
+    """Each render asks the speech service for every narration line, in a fresh media dir like a new job"""
+    from manim_voiceover.services.elevenlabs import ElevenLabsService
+
+    for render in range(renders):
+        media_dir = Path(work_dir) / f"render_{render}"
+        service = ElevenLabsService(voice_name="Adam", voice_settings={"stability": 0.1, "similarity_boost": 0.3})
+        for text in narration_texts(lines):
+            service.generate_from_text(text, cache_dir=media_dir / "voiceovers")
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+
+def render_pipeline(combine, renders, lines, work_dir):
+    """Render the voiceover scene through manim_render, cleaning the output dir after each render like a job"""
+    code = SCENE_TEMPLATE.format(blocks="".join(BLOCK_TEMPLATE.format(n=n) for n in range(lines)))
+    for render in range(renders):
+        output_dir = str(Path(work_dir) / f"render_{render}")
+        success, _ = combine.manim_render(code, output_dir, max_retries=1)
+        if not success:
+            raise RuntimeError(f"Render {render + 1} failed")
+        combine.clean_output_dir(output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the persistent voiceover TTS cache offline, with the fake TTS service")
+    parser.add_argument("--renders", type=int, default=5,
+                        help="Renders of the same voiceover scene (retries, repeated prompts)")
+    parser.add_argument("--lines", type=int, default=6,
+                        help="Voiceover blocks in the scene")
+    parser.add_argument("--tts-latency", type=float, default=0.5,
+                        help="Seconds each fake synthesis takes, standing in for an ElevenLabs round trip")
+    parser.add_argument("--render", action="store_true",
+                        help="Render the scene with Manim through manim_render instead of only synthesizing")
+
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="tts_cache_benchmark_")
+    # voiceover_cache.py (and combine.py) read these at import time
+    os.environ.update({
+        "TTS_SERVICE": "fake",
+        "FAKE_TTS_LATENCY": str(args.tts_latency),
+        "TTS_CACHE_DIR": os.path.join(work_dir, "tts_cache"),
+        "RENDER_CACHE_ENABLED": "0",
+        "VIDEO_CACHE_ENABLED": "0",
+    })
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video_gen"))
+    import voiceover_cache
+
+    voiceover_cache.install()
+    cache = voiceover_cache.tts_cache
+    if args.render:
+        import combine
+        run = lambda: render_pipeline(combine, args.renders, args.lines, work_dir)
+    else:
+        run = lambda: synthesize_only(args.renders, args.lines, work_dir)
+
+    print(f"{args.renders} renders x {args.lines} voiceover lines, {args.tts_latency}s per fake synthesis"
+          f"{' (full Manim render)' if args.render else ''}")
+    results = {}
+    for name, enabled in (("no TTS cache", False), ("TTS cache", True)):
+        voiceover_cache.tts_cache = cache if enabled else None
+        # Render processes read the setting when they start, so start fresh ones
+        os.environ["TTS_CACHE_ENABLED"] = "1" if enabled else "0"
+        if args.render and combine.manim_pool:
+            combine.manim_pool.shutdown()
+        shutil.rmtree(cache.directory, ignore_errors=True)
+        cache.directory.mkdir(parents=True)
+        started = time.perf_counter()
+        run()
+        results[name] = time.perf_counter() - started
+        print(f"{name:<14} total {results[name]:6.2f}s  cached entries {len(list(cache.directory.glob('*.json')))}")
+
+    print(f"Speedup: {results['no TTS cache'] / results['TTS cache']:.1f}x")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,37 @@ from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
-def test_video_generation(prompt, base_url="http://localhost:5555"):
+def follow_job_events(job_id, base_url):
+    """
+    Print a job's progress events from the /job-events SSE stream until it finishes
+
+    Returns:
+        bool: True if the stream ran to the end, False if it could not be followed
+    """
+    try:
+        with requests.get(f"{base_url}/job-events/{job_id}", stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                scene = f" [scene {event['scene']}]" if event.get("scene") else ""
+                print(f"{event['total_elapsed']:8.1f}s {event['stage']:<22}{scene} "
+                      f"(+{event['elapsed']:.1f}s) {event['message']}")
+        return True
+    except requests.exceptions.RequestException as e:
+        print(f"Could not follow job events, falling back to polling: {e}")
+        return False
+
+
+def test_video_generation(prompt, base_url="http://localhost:5555", use_events=True):
     """
     Test the video generation API by sending a request and monitoring the job status
 
     Args:
         prompt (str): The prompt to send to the API
         base_url (str): Base URL of the API server
+        use_events (bool): Follow the job's progress events instead of only polling
 
     Returns:
         bool: True if successful, False otherwise
@@ -42,6 +66,10 @@ def test_video_generation(prompt, base_url="http://localhost:5555"):
     job_id = data["job_id"]
     print(f"Job started with ID: {job_id}")
 
+    # With the event stream the job is finished once it ends, so the poll below returns right away
+    if use_events:
+        follow_job_events(job_id, base_url)
+
     # Poll for job status until complete or error
     max_polls = 100
     poll_interval = 5  # seconds
@@ -58,8 +86,8 @@ def test_video_generation(prompt, base_url="http://localhost:5555"):
             if status_data.get("status") == "success":
                 print("Video generated successfully!")
 
-                # Check if the video file exists in the video_server directory
-                video_path = Path("video_server/temp.mp4")
+                # Check if the job's video file exists in the video_server directory
+                video_path = Path(status_data.get("video_path", ""))
                 if video_path.exists():
                     print(f"Video file exists at: {video_path.absolute()}")
                     print(f"File size: {video_path.stat().st_size} bytes")
@@ -72,8 +100,10 @@ def test_video_generation(prompt, base_url="http://localhost:5555"):
                 print(f"Error generating video: {status_data.get('message')}")
                 return False
 
-            # If still processing, wait and try again
-            if status_data.get("status") == "processing":
+            # If still queued or processing, wait and try again
+            if status_data.get("status") in ("queued", "processing"):
+                if status_data.get("queue_position"):
+                    print(f"Queue position: {status_data['queue_position']}")
                 print(f"Still processing, waiting {poll_interval} seconds...")
                 time.sleep(poll_interval)
                 continue
@@ -109,6 +139,8 @@ def main():
                         help="Prompt to use for video generation")
     parser.add_argument("--url", type=str, default="http://localhost:5555",
                         help="Base URL of the API server")
+    parser.add_argument("--no-events", action="store_true",
+                        help="Only poll /job-status instead of following /job-events")
 
     args = parser.parse_args()
 
@@ -123,7 +155,7 @@ def main():
         return 1
 
     # Run the test
-    success = test_video_generation(args.prompt, args.url)
+    success = test_video_generation(args.prompt, args.url, use_events=not args.no_events)
 
     if success:
         print("Test completed successfully!")
@@ -0,0 +1,131 @@
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# combine.py reads these at import time. Render cache hits would skip the renders being measured, and
+# warm workers only count towards RUSAGE_CHILDREN once they exit, so every render is a fresh manim process.
+# The fake TTS service keeps the voiceover fixture offline.
+os.environ["RENDER_CACHE_ENABLED"] = "0"
+os.environ["RENDER_CACHE_DIR"] = tempfile.mkdtemp(prefix="voiceover_benchmark_render_cache_")
+os.environ["MANIM_WORKERS"] = "0"
+os.environ.setdefault("TTS_SERVICE", "fake")
+os.environ.setdefault("TTS_CACHE_ENABLED", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video_gen"))
+import combine
+
+# A typical generated scene: a title, an axes plot and an equation
+FIXTURE_SCENE = """
+from manim import *
+
+
+class FixtureScene(Scene):
+    def construct(self):
+        title = Text("Quadratic functions", font_size=36).to_edge(UP)
+        self.play(Write(title))
+        axes = Axes(x_range=[-3, 3], y_range=[-1, 9], x_length=6, y_length=4)
+        graph = axes.plot(lambda x: x ** 2, color=BLUE)
+        self.play(Create(axes), run_time=2)
+        self.play(Create(graph), run_time=2)
+        equation = MathTex("y = x^2").next_to(graph, RIGHT)
+        self.play(Write(equation))
+        self.wait(1)
+        self.play(FadeOut(title), FadeOut(axes), FadeOut(graph), FadeOut(equation))
+"""
+
+
+# The same scene wrapped in voiceover blocks, as add_audio would produce it
+FIXTURE_VOICEOVER_SCENE = """
+from manim import *
+from manim_voiceover import VoiceoverScene
+from manim_voiceover.services.elevenlabs import ElevenLabsService
+
+
+class FixtureScene(VoiceoverScene):
+    def construct(self):
+        self.set_speech_service(ElevenLabsService(voice_name="Adam", voice_settings={"stability": 0.1, "similarity_boost": 0.3}))
+        title = Text("Quadratic functions", font_size=36).to_edge(UP)
+        with self.voiceover(text="Quadratic functions.") as tracker:
+            self.play(Write(title), run_time=tracker.duration)
+        axes = Axes(x_range=[-3, 3], y_range=[-1, 9], x_length=6, y_length=4)
+        graph = axes.plot(lambda x: x ** 2, color=BLUE)
+        with self.voiceover(text="Here are the axes, and the parabola y equals x squared.") as tracker:
+            self.play(Create(axes), run_time=tracker.duration / 2)
+            self.play(Create(graph), run_time=tracker.duration / 2)
+        equation = MathTex("y = x^2").next_to(graph, RIGHT)
+        with self.voiceover(text="Its equation is y equals x squared.") as tracker:
+            self.play(Write(equation), run_time=tracker.duration)
+        self.wait(1)
+        with self.voiceover(text="That is the basic quadratic."):
+            self.play(FadeOut(title), FadeOut(axes), FadeOut(graph), FadeOut(equation))
+"""
+
+
+def child_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_pipeline(pipeline, silent_code, voiceover_code, output_dir):
+    """Run render_scene with code generation stubbed out, counting Manim renders and their CPU time"""
+    renders = []
+    real_render = combine.manim_render
+
+    def counting_render(code, *args, **kwargs):
+        renders.append(code)
+        return real_render(code, *args, **kwargs)
+
+    combine.VOICEOVER_PIPELINE = pipeline
+    combine.get_video_gencode = lambda client, prompt, **kwargs: silent_code
+    combine.add_audio = lambda gemini, prompt, **kwargs: voiceover_code
+    combine.manim_render = counting_render
+
+    cpu_before = child_cpu_seconds()
+    start = time.perf_counter()
+    try:
+        video_path = combine.render_scene(None, None, {"title": "Fixture", "description": "benchmark"}, 0, output_dir)
+    finally:
+        combine.manim_render = real_render
+    return {
+        "pipeline": pipeline,
+        "renders": len(renders),
+        "wall_s": time.perf_counter() - start,
+        "cpu_s": child_cpu_seconds() - cpu_before,
+        "ok": video_path is not None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Manim CPU time per scene for the voiceover pipelines")
+    parser.add_argument("--script", default=None,
+                        help="Silent Manim fixture script (defaults to a built-in axes/equation scene)")
+    parser.add_argument("--voiceover-script", default=None,
+                        help="Voiceover version of the fixture (defaults to the built-in scene with voiceover "
+                             "blocks, voiced by the fake TTS service unless TTS_SERVICE is set)")
+
+    args = parser.parse_args()
+
+    silent_code = Path(args.script).read_text() if args.script else FIXTURE_SCENE
+    voiceover_code = Path(args.voiceover_script).read_text() if args.voiceover_script else FIXTURE_VOICEOVER_SCENE
+
+    rows = []
+    for pipeline in ("silent_first", "render_once"):
+        with tempfile.TemporaryDirectory() as output_dir:
+            print(f"Rendering fixture with VOICEOVER_PIPELINE={pipeline}...")
+            rows.append(run_pipeline(pipeline, silent_code, voiceover_code, output_dir))
+
+    print("\n" + "-" * 60)
+    print(f"{'pipeline':>14} {'ok':>4} {'renders':>8} {'wall s':>8} {'manim cpu s':>12}")
+    for row in rows:
+        print(f"{row['pipeline']:>14} {str(row['ok']):>4} {row['renders']:>8} "
+              f"{row['wall_s']:>8.2f} {row['cpu_s']:>12.2f}")
+    print("-" * 60)
+    if rows[0]["cpu_s"]:
+        print(f"render_once uses {rows[1]['cpu_s'] / rows[0]['cpu_s']:.0%} of the silent_first Manim CPU time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import ast
+import builtins
+import functools
+import importlib
+import inspect
+
+# Top-level modules generated scene code may import
+ALLOWED_IMPORTS = {
+    "manim", "manim_voiceover", "numpy", "math", "random", "ssl", "itertools", "functools",
+    "colour", "typing", "__future__",
+}
+
+# Base classes a renderable scene can derive from
+SCENE_BASES = {"Scene", "VoiceoverScene", "MovingCameraScene", "ThreeDScene", "ZoomedScene"}
+
+
+@functools.lru_cache(maxsize=None)
+def module_namespace(module_name):
+    """
+    Public names a `from module import *` brings in, or None when the module
+    isn't installed here (name and signature checks for it are then skipped)
+    """
+    try:
+        module = importlib.import_module(module_name)
+    except Exception:
+        return None
+    names = getattr(module, "__all__", None) or [name for name in dir(module) if not name.startswith("_")]
+    return {name: getattr(module, name, None) for name in names}
+
+
+@functools.lru_cache(maxsize=None)
+def accepted_kwargs(callable_obj):
+    """
+    Keyword arguments a Manim class or function accepts, or None if it takes
+    any. Manim constructors pass **kwargs up the class hierarchy until some
+    base consumes them, so for classes the __init__ parameters of the whole MRO
+    count, stopping at the first __init__ without **kwargs.
+    """
+    initializers = [klass.__dict__["__init__"] for klass in callable_obj.__mro__
+                    if "__init__" in klass.__dict__] if inspect.isclass(callable_obj) else [callable_obj]
+    names = set()
+    for initializer in initializers:
+        if initializer is object.__init__:
+            return None
+        try:
+            parameters = inspect.signature(initializer).parameters.values()
+        except (TypeError, ValueError):
+            return None
+        names.update(p.name for p in parameters if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY))
+        if not any(p.kind == p.VAR_KEYWORD for p in parameters):
+            return names
+    return None
+
+
+def error(node, code, message):
+    return {"line": getattr(node, "lineno", None), "code": code, "message": message}
+
+
+def bound_names(tree):
+    """Every name the code binds anywhere; scopes are not told apart, which keeps the check permissive"""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias) and node.name != "*":
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.MatchAs) and node.name:
+            names.add(node.name)
+    return names
+
+
+def validate_scene_code(code):
+    """
+    Check generated Manim code without running it or touching the disk.
+    Returns a list of {"line", "code", "message"} dicts, empty when the code
+    looks renderable:
+      - it parses
+      - it only imports allowed modules
+      - it defines a Scene (or VoiceoverScene, ...) subclass with construct()
+      - every name it reads is defined, built in, or star-imported
+      - Manim classes and functions are only called with keyword arguments
+        their installed signatures accept
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [{"line": e.lineno, "code": "syntax-error", "message": f"SyntaxError: {e.msg}"}]
+
+    errors = []
+    namespace = {}
+    unresolved_star_import = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+            if any(alias.name == "*" for alias in node.names):
+                star_names = module_namespace(node.module)
+                if star_names is None:
+                    unresolved_star_import = True
+                else:
+                    namespace.update(star_names)
+        else:
+            continue
+        for module in modules:
+            if module.split(".")[0] not in ALLOWED_IMPORTS:
+                errors.append(error(node, "disallowed-import", f"Import of '{module}' is not allowed"))
+
+    scene_classes = [
+        node for node in tree.body
+        if isinstance(node, ast.ClassDef) and any(
+            (isinstance(base, ast.Name) and base.id in SCENE_BASES)
+            or (isinstance(base, ast.Attribute) and base.attr in SCENE_BASES)
+            for base in node.bases
+        )
+    ]
+    if not scene_classes:
+        errors.append(error(tree, "no-scene",
+                            "No class deriving from Scene or VoiceoverScene; Manim has nothing to render"))
+    for scene_class in scene_classes:
+        if not any(isinstance(item, ast.FunctionDef) and item.name == "construct" for item in scene_class.body):
+            errors.append(error(scene_class, "no-construct", f"Scene class {scene_class.name} has no construct() method"))
+
+    # Unknown names can only be told apart from star-imported ones when every star import resolved
+    if not unresolved_star_import:
+        known = bound_names(tree) | set(dir(builtins)) | set(namespace)
+        reported = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) \
+                    and node.id not in known and node.id not in reported:
+                reported.add(node.id)
+                errors.append(error(node, "undefined-name", f"Name '{node.id}' is not defined"))
+
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+            continue
+        target = namespace.get(node.func.id)
+        if target is None or not callable(target):
+            continue
+        allowed = accepted_kwargs(target)
+        if allowed is None:
+            continue
+        for keyword in node.keywords:
+            if keyword.arg is not None and keyword.arg not in allowed:
+                errors.append(error(node, "unknown-kwarg",
+                                    f"{node.func.id}() got an unexpected keyword argument '{keyword.arg}'"))
+
+    return sorted(errors, key=lambda e: e["line"] or 0)
+
+
+def signatures_available():
+    """Whether Manim is installed here, so names and keyword arguments can be checked"""
+    return module_namespace("manim") is not None
+
+
+def format_validation_errors(errors):
+    """Render validation errors as text for the retry prompt"""
+    return "\n".join(
+        f"Line {e['line']}: {e['message']}" if e["line"] else e["message"]
+        for e in errors
+    )
@@ -1,26 +1,93 @@
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
-import py_compile
+import re
+import sqlite3
 import tempfile
 import subprocess
 from pathlib import Path
 import shutil
 import glob
+import collections
+import heapq
+import itertools
 from pydantic import BaseModel, Field
 from google import genai
+from google.genai import types as genai_types
+import httpx
 import concurrent.futures
+import functools
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
 import traceback
 import sys
 import time
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import threading
 import uuid
 from flask_cors import CORS
+from manim_workers import ManimWorkerPool, WorkerUnavailable
+from retry_policy import call_with_retry, backoff, is_transient, limiters
+import voiceover_cache
+from code_validator import validate_scene_code, format_validation_errors, signatures_available
 
 app = Flask(__name__)
 CORS(app)
 
+# Scenes rendered at once; each render is a separate Manim process, so size this to the cores
+SCENE_WORKERS = int(os.getenv("SCENE_WORKERS", str(os.cpu_count() or 1)))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+# LLM API endpoints, overridable to point at a proxy or a local stub
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+# Pooled connections kept open per provider; HTTP/2 is used when the h2 package is installed
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+# Warm Manim worker processes; 0 shells out to the manim CLI for every render
+MANIM_WORKERS = int(os.getenv("MANIM_WORKERS", str(os.cpu_count() or 1)))
+# Renders a worker does before it is replaced, and seconds a single render may take
+MANIM_WORKER_MAX_JOBS = int(os.getenv("MANIM_WORKER_MAX_JOBS", "20"))
+MANIM_RENDER_TIMEOUT = int(os.getenv("MANIM_RENDER_TIMEOUT", "600"))
+# Speculative codegen: candidates requested at once per round (1 keeps the one-at-a-time loop),
+# sampled at temperatures spread over [min, max], each validated with a Manim dry run
+CODEGEN_CANDIDATES = int(os.getenv("CODEGEN_CANDIDATES", "1"))
+CODEGEN_TEMPERATURE_MIN = float(os.getenv("CODEGEN_TEMPERATURE_MIN", "0.2"))
+CODEGEN_TEMPERATURE_MAX = float(os.getenv("CODEGEN_TEMPERATURE_MAX", "1.2"))
+CODEGEN_MAX_TOKENS = int(os.getenv("CODEGEN_MAX_TOKENS", "4096"))
+# Tokens a scene may spend across all rounds before speculative codegen gives up
+CODEGEN_TOKEN_BUDGET = int(os.getenv("CODEGEN_TOKEN_BUDGET", "100000"))
+CODEGEN_DRY_RUN = os.getenv("CODEGEN_DRY_RUN", "1") == "1"
+# Quality flags passed to every Manim render; part of the render cache key
+MANIM_QUALITY_FLAGS = "-pql"
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "1") == "1"
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "render_cache")
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+VIDEO_CACHE_ENABLED = os.getenv("VIDEO_CACHE_ENABLED", "1") == "1"
+VIDEO_CACHE_PATH = os.getenv("VIDEO_CACHE_PATH", "video_cache.sqlite3")
+VIDEO_CACHE_TTL = int(os.getenv("VIDEO_CACHE_TTL", str(24 * 3600)))
+# Jobs generated at once; each one runs up to SCENE_WORKERS Manim processes
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "2"))
+# Jobs allowed to wait for a worker before /generate-video answers 429
+VIDEO_QUEUE_SIZE = int(os.getenv("VIDEO_QUEUE_SIZE", "16"))
+# Seconds a finished job's status and progress events stay available to /job-status and /job-events
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Finished videos are served from VIDEO_SERVER_DIR by video_server/server_videos.py at VIDEO_SERVER_URL
+VIDEO_SERVER_DIR = os.getenv("VIDEO_SERVER_DIR", "video_server")
+VIDEO_SERVER_URL = os.getenv("VIDEO_SERVER_URL", "http://localhost:5556")
+# Served videos are kept until they are older than this or the directory outgrows the size cap
+VIDEO_RETENTION_SECONDS = int(os.getenv("VIDEO_RETENTION_SECONDS", str(7 * 24 * 3600)))
+VIDEO_SERVER_MAX_BYTES = int(os.getenv("VIDEO_SERVER_MAX_BYTES", str(5 * 1024 ** 3)))
+# render_once renders only the voiceover version of a scene; silent_first renders it silently first
+VOICEOVER_PIPELINE = os.getenv("VOICEOVER_PIPELINE", "render_once")
+VOICEOVER_MANIM_LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voiceover_cache.py")
+# stream starts each scene as soon as the streamed Gemini plan completes it; single_call plans a
+# one-scene video and writes its code in one DeepSeek request
+SCENE_PLAN_MODE = os.getenv("SCENE_PLAN_MODE", "stream")
+
 
 class Scene(BaseModel):
     title: str = Field(..., description="Title of the scene/topic")
@@ -32,25 +99,129 @@ class VideoRequest(BaseModel):
     video_title: str = Field(..., description="Title of the video")
 
 
-def setup_environment():
-    try:
+class JobEvents:
+    """
+    Ordered log of progress events for one video job. Stage timers are kept
+    per scene, so `elapsed` on an event is the time since the previous event
+    for the same scene (or for the job as a whole when there is no scene).
+    """
+
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+        self.started = time.time()
+        self.last_event_at = {}
+        self.finished = False
+        self.finished_at = None
+
+    def emit(self, stage, message, scene=None, **details):
+        with self.condition:
+            now = time.time()
+            event = {
+                "id": len(self.events) + 1,
+                "stage": stage,
+                "message": message,
+                "scene": scene,
+                "timestamp": now,
+                "elapsed": round(now - self.last_event_at.get(scene, self.started), 3),
+                "total_elapsed": round(now - self.started, 3),
+                **details
+            }
+            self.last_event_at[scene] = now
+            self.events.append(event)
+            if stage in ("done", "error"):
+                self.finished = True
+                self.finished_at = now
+            self.condition.notify_all()
+        return event
+
+    def wait_for(self, after, timeout):
+        """Events with an id greater than `after`, blocking up to `timeout` seconds for new ones"""
+        with self.condition:
+            if len(self.events) <= after and not self.finished:
+                self.condition.wait(timeout)
+            return self.events[after:], self.finished
+
+
+# Progress events per job ID, streamed by /job-events/<job_id>
+job_events = {}
+
+
+def emit_progress(job_id, stage, message, scene=None, **details):
+    """Record a pipeline stage transition for a job and mirror it into its status message"""
+    events = job_events.get(job_id)
+    if events is None:
+        return
+    events.emit(stage, message, scene, **details)
+    status = job_status.get(job_id)
+    if status and status.get("status") == "processing":
+        status["message"] = message
+
+
+def no_progress(stage, message, **details):
+    pass
+
+
+def pooled_http_client():
+    """An httpx client whose keep-alive connections (and TLS sessions) outlive single requests"""
+    return httpx.Client(
+        http2=LLM_HTTP2,
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                            keepalive_expiry=LLM_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(600, connect=10),
+    )
+
+
+class ClientRegistry:
+    """
+    Process-lifetime Gemini and DeepSeek clients shared by every job and
+    thread, so connection pools and TLS sessions survive across requests,
+    attempts and jobs. Both SDK clients are safe to use from several threads.
+    Clients are built on first use; a failed setup (e.g. a missing key) isn't
+    remembered, so fixing .env takes effect on the next attempt.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = None
+
+    def get(self):
+        with self.lock:
+            if self.clients is None:
+                self.clients = self._create()
+            return self.clients
+
+    def _create(self):
         load_dotenv()
         deepseek_api_key = os.getenv("DEEPSEEKAPIKEY")
         gemini_api_key = os.getenv("GEMINI_API_KEY")
 
         if not deepseek_api_key:
-            print("ERROR: Missing DEEPSEEKAPIKEY in environment")
-            return None, None
+            raise RuntimeError("Missing DEEPSEEKAPIKEY in environment")
 
         if not gemini_api_key:
-            print("ERROR: Missing GEMINI_API_KEY in environment")
-            return None, None
+            raise RuntimeError("Missing GEMINI_API_KEY in environment")
+
+        http_options = {"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else {}
+        # Older google-genai releases can't take a caller-supplied httpx client
+        if "httpx_client" in genai_types.HttpOptions.model_fields:
+            http_options["httpx_client"] = pooled_http_client()
+        gemini = genai.Client(api_key=gemini_api_key, http_options=genai_types.HttpOptions(**http_options))
+        # retry_policy is the only retry layer: SDK retries would skip the rate limiter and Retry-After handling
+        client = OpenAI(api_key=deepseek_api_key, base_url=DEEPSEEK_BASE_URL, http_client=pooled_http_client(),
+                        max_retries=0)
+
+        print(f"LLM clients created (HTTP/2 {'on' if LLM_HTTP2 else 'off'})")
+        return gemini, client
 
-        gemini = genai.Client(api_key=gemini_api_key)
-        client = OpenAI(api_key=deepseek_api_key, base_url="https://api.deepseek.com")
 
-        print("Environment setup successful")
-        return gemini, client
+client_registry = ClientRegistry()
+
+
+def setup_environment():
+    """Shared Gemini and DeepSeek clients, or (None, None) if they can't be created"""
+    try:
+        return client_registry.get()
     except Exception as e:
         print(f"ERROR in setup_environment: {e}")
         traceback.print_exc()
@@ -79,57 +250,220 @@ def extract_python_code(content):
         return None
 
 
-def compile_code(code, temp_file_path):
+def request_code(client, model_name, system_prompt, input_prompt, max_retries=3):
+    message = system_prompt + " " + input_prompt
+
     try:
-        py_compile.compile(temp_file_path, doraise=True)
-        print("Code compiled successfully.")
-        return True
-    except py_compile.PyCompileError as e:
-        print("Compilation failed with PyCompileError:")
-        print(e)
-        return False
-    except SyntaxError as e:
-        print("Compilation failed with SyntaxError:")
-        print(e)
-        return False
+        print(f"Requesting code from {model_name}")
+        # Throttling and transient upstream errors are retried with backoff, anything else fails fast
+        response = call_with_retry(
+            "deepseek",
+            client.chat.completions.create,
+            max_attempts=max_retries,
+            model=model_name,
+            messages=[
+                {
+                    "role": "user",
+                    "content": message
+                }
+            ],
+        )
+        return response.choices[0].message.content
     except Exception as e:
-        print(f"Compilation failed with unexpected error: {type(e).__name__}")
+        print(f"API request failed: {e}")
         traceback.print_exc()
-        return False
 
+    print("All API request attempts failed")
+    return None
 
-def request_code(client, model_name, system_prompt, input_prompt, max_retries=3):
-    message = system_prompt + " " + input_prompt
-    retry_count = 0
 
-    while retry_count < max_retries:
+class CodegenStats:
+    """Running per-candidate latency and outcome counts for speculative codegen"""
+
+    def __init__(self, window=500):
+        self.lock = threading.Lock()
+        self.outcomes = collections.Counter()
+        self.latencies = collections.deque(maxlen=window)
+        self.tokens = 0
+
+    def record(self, candidate):
+        with self.lock:
+            self.outcomes[candidate["status"]] += 1
+            self.tokens += candidate["tokens"]
+            if candidate["status"] != "cancelled":
+                self.latencies.append(candidate["latency"])
+
+    def summary(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            attempts = sum(count for status, count in self.outcomes.items() if status != "cancelled")
+            return {
+                "attempts": attempts,
+                "success_rate": self.outcomes["valid"] / attempts if attempts else None,
+                "outcomes": dict(self.outcomes),
+                "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+                "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+                "tokens": self.tokens,
+            }
+
+
+codegen_stats = CodegenStats()
+
+
+def dry_render(code):
+    """Execute the scene with Manim without writing video; returns an error message, or None if it ran"""
+    scene_class_match = re.search(r'class\s+(\w+)\((?:Voiceover)?Scene\)', code)
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "candidate.py")
+        with open(source_path, "w") as source_file:
+            source_file.write(code)
+        stderr_parser = ManimProgressParser(no_progress)
+        return_code = run_manim(source_path, work_dir, scene_class_match.group(1) if scene_class_match else None,
+                                stderr_parser, dry_run=True)
+    if return_code == 0:
+        return None
+    # The end of the traceback names the actual error
+    return "\n".join(stderr_parser.output().strip().splitlines()[-5:]) or f"Dry run exited with code {return_code}"
+
+
+def generate_code_candidate(client, message, temperature, cancelled):
+    """
+    Request, extract and validate one code candidate. Returns a dict with its
+    status (valid, invalid, no_code, request_failed, dry_run_failed or
+    cancelled), the code, any errors, the tokens used and the latency.
+    """
+    start = time.time()
+    candidate = {"temperature": temperature, "code": None, "errors": [], "tokens": 0, "status": "cancelled"}
+    try:
+        if cancelled.is_set():
+            return candidate
         try:
-            print(f"Requesting code from {model_name}, attempt {retry_count + 1}")
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": message
-                    }
-                ],
+            response = call_with_retry(
+                "deepseek",
+                client.chat.completions.create,
+                model="deepseek-chat",
+                messages=[{"role": "user", "content": message}],
+                temperature=temperature,
+                max_tokens=CODEGEN_MAX_TOKENS,
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"API request failed: {e}")
-            traceback.print_exc()
-            retry_count += 1
-            if retry_count < max_retries:
-                print(f"Retrying in 5 seconds...")
-                time.sleep(5)
+            candidate.update(status="request_failed", errors=[{"line": None, "code": "request", "message": str(e)}])
+            return candidate
+        if response.usage:
+            candidate["tokens"] = response.usage.total_tokens
+
+        code = extract_python_code(response.choices[0].message.content or "")
+        if not code:
+            candidate.update(status="no_code", errors=[{
+                "line": None, "code": "no-code",
+                "message": "Could not extract Python code from response. Make sure to include your code within "
+                           "```python and ``` markers."
+            }])
+            return candidate
+        candidate["code"] = code
+
+        # Another candidate may have won while this one was being generated
+        if cancelled.is_set():
+            return candidate
+
+        errors = validate_scene_code(code)
+        if errors:
+            candidate.update(status="invalid", errors=errors)
+            return candidate
+
+        if CODEGEN_DRY_RUN and not cancelled.is_set():
+            dry_run_error = dry_render(code)
+            if dry_run_error:
+                candidate.update(status="dry_run_failed",
+                                 errors=[{"line": None, "code": "dry-run", "message": dry_run_error}])
+                return candidate
+
+        candidate["status"] = "valid"
+        return candidate
+    finally:
+        candidate["latency"] = round(time.time() - start, 3)
+        codegen_stats.record(candidate)
+
+
+def speculative_video_gencode(client, prompt, max_rounds, progress=no_progress):
+    """
+    Ask for CODEGEN_CANDIDATES candidates at once, at varied temperatures, and
+    take the first one that passes validation (and the dry run). The others are
+    abandoned: their requests can't be aborted, but they skip validation once a
+    winner exists. Rounds repeat with the errors of the failed candidates until
+    one passes, `max_rounds` is reached or the token budget runs out.
+    """
+    from prompt_video import system_prompt
 
-    print("All API request attempts failed")
+    count = CODEGEN_CANDIDATES
+    temperatures = [
+        round(CODEGEN_TEMPERATURE_MIN + (CODEGEN_TEMPERATURE_MAX - CODEGEN_TEMPERATURE_MIN) * n / max(count - 1, 1), 2)
+        for n in range(count)
+    ]
+    error_context = ""
+    tokens_used = 0
+
+    for round_number in range(1, max_rounds + 1):
+        if tokens_used >= CODEGEN_TOKEN_BUDGET:
+            print(f"Codegen token budget of {CODEGEN_TOKEN_BUDGET} spent after {tokens_used} tokens")
+            break
+
+        full_prompt = prompt
+        if error_context:
+            full_prompt = f"{prompt}\n\nPrevious attempt failed with the following error. Please fix it:\n{error_context}"
+        message = system_prompt + " " + full_prompt
+
+        print(f"Codegen round {round_number}: requesting {count} candidates at temperatures {temperatures}")
+        round_start = time.time()
+        cancelled = threading.Event()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=count)
+        futures = [executor.submit(generate_code_candidate, client, message, temperature, cancelled)
+                   for temperature in temperatures]
+        # Don't wait for the losers; their threads wind down on their own
+        executor.shutdown(wait=False)
+
+        winner = None
+        failed = []
+        for future in concurrent.futures.as_completed(futures):
+            candidate = future.result()
+            tokens_used += candidate["tokens"]
+            print(f"Candidate at temperature {candidate['temperature']}: {candidate['status']} "
+                  f"in {candidate['latency']}s")
+            if candidate["status"] == "valid":
+                winner = candidate
+                cancelled.set()
+                break
+            failed.append(candidate)
+
+        stats = codegen_stats.summary()
+        progress("code_candidates", f"Codegen round {round_number}: "
+                                    f"{'candidate accepted' if winner else 'no valid candidate'}",
+                 round=round_number, round_latency=round(time.time() - round_start, 3),
+                 candidates=[{k: c[k] for k in ("temperature", "status", "latency", "tokens")}
+                             for c in failed + ([winner] if winner else [])],
+                 success_rate=stats["success_rate"], latency_p50=stats["latency_p50"])
+        if winner:
+            return winner["code"]
+
+        # Retry with the most specific errors: validation or dry run over missing code or failed requests
+        failed.sort(key=lambda c: ["invalid", "dry_run_failed", "no_code", "request_failed", "cancelled"].index(c["status"]))
+        error_context = format_validation_errors(failed[0]["errors"])
+        progress("compile_failed", "Generated code failed validation, retrying", attempt=round_number,
+                 errors=failed[0]["errors"])
+
+    print("All speculative codegen rounds failed to produce valid Python code.")
     return None
 
 
-def get_video_gencode(client, prompt, max_retries=20):  # Increased max_retries from 10 to 20
+def get_video_gencode(client, prompt, max_retries=20, progress=no_progress):  # Increased max_retries from 10 to 20
     from prompt_video import system_prompt
 
+    if CODEGEN_CANDIDATES > 1:
+        # Same overall number of candidates, requested CODEGEN_CANDIDATES at a time
+        return speculative_video_gencode(client, prompt, (max_retries + CODEGEN_CANDIDATES - 1) // CODEGEN_CANDIDATES,
+                                         progress)
+
     attempt = 0
     current_prompt = prompt
     error_context = ""
@@ -146,9 +480,9 @@ def get_video_gencode(client, prompt, max_retries=20):  # Increased max_retries
 
         content = request_code(client, model, system_prompt, full_prompt)
         if not content:
+            # request_code already backed off on upstream errors
             print("Failed to get response from API")
             attempt += 1
-            time.sleep(2)  # Added delay between retries
             continue
 
         python_code = extract_python_code(content)
@@ -156,86 +490,252 @@ def get_video_gencode(client, prompt, max_retries=20):  # Increased max_retries
             print("Could not extract Python code from response.")
             attempt += 1
             error_context = "Could not extract Python code from response. Make sure to include your code within ```python and ``` markers."
-            time.sleep(2)  # Added delay between retries
+            progress("codegen_retry", "No code block in the response, retrying", attempt=attempt)
             continue
 
-        # Write code to temp file for compilation testing
-        temp_file_path = None
         try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-                temp_file.write(python_code)
-                temp_file_path = temp_file.name
-
-            # Test compilation
-            if compile_code(python_code, temp_file_path):
-                # Further validation: check for known Manim issues
-                if "height" in python_code and "Axes(" in python_code:
-                    print("WARNING: Code might contain the 'height' parameter issue with Axes()")
-                    # Try to fix the height parameter issue
-                    if "height=" in python_code:
-                        python_code = python_code.replace("height=", "y_length=")
-                        print("Automatically replaced 'height=' with 'y_length='")
-
-                        # Re-test the fixed code
-                        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as fixed_file:
-                            fixed_file.write(python_code)
-                            fixed_file_path = fixed_file.name
-
-                        if not compile_code(python_code, fixed_file_path):
-                            error_context = "Code still has issues after automatic fixes."
-                            os.remove(fixed_file_path)
-                            attempt += 1
-                            time.sleep(2)  # Added delay between retries
-                            continue
-
-                        os.remove(fixed_file_path)
-
-                # Additional validation for Manim-specific syntax
-                if "Axes(" in python_code:
-                    for invalid_param in ["height=", "width="]:
-                        if invalid_param in python_code:
-                            print(f"WARNING: Found potential Manim API issue: {invalid_param}")
-                            error_context = f"Manim API issue: {invalid_param} is not a valid parameter for Axes. Use x_length and y_length instead."
-                            break
-                    else:  # No breaks occurred
-                        # All checks passed, return the code
-                        if temp_file_path and os.path.exists(temp_file_path):
-                            os.remove(temp_file_path)
-                        return python_code
-                else:
-                    # No Axes objects to check, return the code
-                    if temp_file_path and os.path.exists(temp_file_path):
-                        os.remove(temp_file_path)
-                    return python_code
-            else:
-                # Compilation failed, update error context for next attempt
-                error_context = f"Compilation error in previous code."
+            # Without Manim installed only syntax and structure can be checked, so keep
+            # the old string heuristics for the Axes width/height mix-up
+            if not signatures_available() and "Axes(" in python_code and "height=" in python_code:
+                print("WARNING: Code might contain the 'height' parameter issue with Axes()")
+                python_code = python_code.replace("height=", "y_length=")
+                print("Automatically replaced 'height=' with 'y_length='")
+
+            # In-process static checks: syntax, imports, scene class, names and Manim keyword arguments
+            errors = validate_scene_code(python_code)
+            if not errors and not signatures_available() and "Axes(" in python_code and "width=" in python_code:
+                errors = [{"line": None, "code": "unknown-kwarg",
+                           "message": "width= is not a valid parameter for Axes. Use x_length and y_length instead."}]
+            if not errors:
+                return python_code
+
+            # Validation failed, feed the errors into the next attempt's prompt
+            error_context = format_validation_errors(errors)
+            print(f"Generated code failed validation:\n{error_context}")
+            progress("compile_failed", "Generated code failed validation, retrying", attempt=attempt + 1,
+                     errors=errors)
         except Exception as e:
             print(f"Unexpected error during code validation: {e}")
             traceback.print_exc()
             error_context = f"Unexpected error: {str(e)}"
-        finally:
-            # Clean up temp file
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                except:
-                    pass
 
-        # If we got here, there was an error - increment attempt counter
+        # If we got here, there was an error - increment attempt counter.
+        # Local validation failures are retried right away; there is nothing to wait for
         attempt += 1
 
-        # Add some delay between retries
-        time.sleep(2)
-
     print("All attempts failed to produce valid Python code.")
     return None
 
 
-def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added max_retries parameter
+class RenderCache:
+    """
+    Content-addressed cache of Manim renders, so retries, duplicate prompts and
+    repeated topics don't re-render identical code. Keys hash the normalized
+    scene code together with the quality flags and the installed Manim version.
+    Each entry is a directory holding the final mp4 and Manim's partial movie
+    segments; directory mtimes track recency and the least recently used
+    entries are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            self.manim_version = importlib.metadata.version("manim")
+        except importlib.metadata.PackageNotFoundError:
+            self.manim_version = "unknown"
+
+    @staticmethod
+    def normalize_code(code):
+        # Whitespace-only differences don't change the rendered frames
+        lines = [line.rstrip() for line in code.replace("\r\n", "\n").split("\n")]
+        return "\n".join(line for line in lines if line)
+
+    def key(self, code, scene_class=None):
+        # A voiceover render made with the fake TTS service must never be served for the real one
+        parts = [self.normalize_code(code), scene_class or "", MANIM_QUALITY_FLAGS, self.manim_version]
+        if ".voiceover(" in code:
+            parts.append(voiceover_cache.TTS_SERVICE)
+        material = "\0".join(parts)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key, output_dir):
+        """Copy a cached render into output_dir and return its path, or None on a miss"""
+        entry = self.directory / key
+        with self.lock:
+            cached_video = entry / "final.mp4"
+            if not cached_video.exists():
+                return None
+            os.utime(entry)
+            dest_dir = Path(output_dir) / "cached" / key[:16]
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            dest_path = dest_dir / "final.mp4"
+            shutil.copy2(cached_video, dest_path)
+        return str(dest_path)
+
+    def put(self, keys, video_path):
+        """Store a finished render (and its partial movie segments) under every key in `keys`"""
+        partial_dir = Path(video_path).parent / "partial_movie_files"
+        with self.lock:
+            for key in keys:
+                entry = self.directory / key
+                if (entry / "final.mp4").exists():
+                    os.utime(entry)
+                    continue
+                # Build the entry next to its final location and rename it into place
+                staging = self.directory / f".{key}.{uuid.uuid4().hex}"
+                staging.mkdir(parents=True)
+                shutil.copy2(video_path, staging / "final.mp4")
+                if partial_dir.is_dir():
+                    shutil.copytree(partial_dir, staging / "partial_movie_files")
+                shutil.rmtree(entry, ignore_errors=True)
+                staging.rename(entry)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in self.directory.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry))
+            total += size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            print(f"Evicted render cache entry {entry.name}")
+
+
+render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES) if RENDER_CACHE_ENABLED else None
+
+
+# tqdm progress bars Manim writes to stderr, e.g. "Animation 2: Write(...):  45%|####  | 27/60"
+MANIM_PROGRESS_PATTERN = re.compile(r"Animation (\d+).*?(\d+)%\|.*?(\d+)/(\d+)")
+
+
+class ManimProgressParser:
+    """
+    Collects Manim's stderr for error handling and reports frame progress from
+    it. Progress bars redraw with carriage returns, so the text is split on
+    those as well as newlines; events are sent every 25% per animation.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.chunks = []
+        self.line = ""
+        self.reported = set()
+
+    def feed(self, text):
+        self.chunks.append(text)
+        for char in text:
+            if char not in "\r\n":
+                self.line += char
+                continue
+            match = MANIM_PROGRESS_PATTERN.search(self.line)
+            self.line = ""
+            if not match:
+                continue
+            animation, percent, frames_done, frames_total = (int(group) for group in match.groups())
+            step = (animation, percent // 25)
+            if step not in self.reported:
+                self.reported.add(step)
+                self.progress("render_progress", f"Rendering animation {animation}: {percent}%",
+                              animation=animation, percent=percent, frames_done=frames_done,
+                              frames_total=frames_total)
+
+    def output(self):
+        return "".join(self.chunks)
+
+
+def run_manim_subprocess(source_path, output_dir, scene_class, stderr_parser, dry_run=False, voiceover=False):
+    """Render with a fresh `manim` CLI process; returns its exit code"""
+    # Build the command; a dry run executes the scene without writing video (or opening a preview)
+    flags = "-ql --dry_run" if dry_run else MANIM_QUALITY_FLAGS
+    # Voiceover scenes go through a launcher that installs the TTS cache before running manim
+    manim_command = f"{sys.executable} {VOICEOVER_MANIM_LAUNCHER}" if voiceover else "manim"
+    command = f"{manim_command} {flags} --media_dir {output_dir} {source_path}"
+    if scene_class:
+        command += f" {scene_class}"
+
+    print(f"Executing command: {command}")
+
+    # Run the command and capture output
+    process = subprocess.Popen(
+        command,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    # Stderr is read on its own thread so progress bars are parsed as they are drawn
+    def read_stderr():
+        for char in iter(lambda: process.stderr.read(1), ""):
+            stderr_parser.feed(char)
+
+    stderr_reader = threading.Thread(target=read_stderr, daemon=True)
+    stderr_reader.start()
+
+    # Print output in real-time
+    for line in process.stdout:
+        print(line, end='')
+        # Look for the path output line
+        if "File ready at" in line:
+            video_path = line.strip().split("File ready at ")[-1]
+            print(f"\nVIDEO PATH: {video_path}")
+
+    # Wait for process to complete
+    return_code = process.wait()
+    stderr_reader.join()
+    return return_code
+
+
+def run_manim(source_path, output_dir, scene_class, stderr_parser, dry_run=False):
+    """Render on a warm worker when the pool is usable, otherwise with the `manim` CLI; returns an exit code"""
+    # Voiceover blocks call ElevenLabs from inside the render, so reserve the requests
+    # the TTS cache can't answer up front
+    with open(source_path) as source_file:
+        source = source_file.read()
+    syntheses = voiceover_cache.pending_syntheses(source)
+    if syntheses:
+        limiters["elevenlabs"].acquire(syntheses)
+    if manim_pool and manim_pool.available:
+        try:
+            print(f"Rendering {source_path} on a warm Manim worker")
+            return_code, error_output = manim_pool.render(source_path, output_dir, scene_class, stderr_parser.feed,
+                                                          dry_run)
+            stderr_parser.feed(error_output)
+            return return_code
+        except WorkerUnavailable as e:
+            print(f"Manim worker pool unavailable, using the manim CLI instead: {e}")
+    return run_manim_subprocess(source_path, output_dir, scene_class, stderr_parser, dry_run,
+                                ".voiceover(" in source)
+
+
+manim_pool = ManimWorkerPool(MANIM_WORKERS, MANIM_WORKER_MAX_JOBS, MANIM_RENDER_TIMEOUT) if MANIM_WORKERS > 0 else None
+
+
+def manim_render(code, output_dir, scene_class=None, max_retries=5, progress=no_progress):  # Added max_retries parameter
     retry_count = 0
     original_code = code
 
+    # Identical code rendered before (by a retry, another job or another scene) skips Manim entirely
+    cache_keys = []
+    requested_scene_class = scene_class
+    if render_cache:
+        cache_keys.append(render_cache.key(code, requested_scene_class))
+        cached_video = render_cache.get(cache_keys[0], output_dir)
+        if cached_video:
+            print(f"\nRender cache hit, VIDEO PATH: {cached_video}")
+            progress("render_done", "Render served from cache", cached=True)
+            return True, cached_video
+
     while retry_count < max_retries:
         try:
             print(f"Manim render attempt {retry_count + 1} of {max_retries}")
@@ -250,7 +750,6 @@ def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added ma
 
                 # Determine the scene class name from the code if not provided
                 if not scene_class:
-                    import re
                     scene_class_match = re.search(r'class\s+(\w+)\(Scene\)', code)
                     if scene_class_match:
                         scene_class = scene_class_match.group(1)
@@ -258,41 +757,17 @@ def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added ma
                     else:
                         print("WARNING: Could not determine scene class name. Using default options.")
 
-                # Build the command
-                command = f"manim -pql --media_dir {output_dir} {temp_file_path}"
-                if scene_class:
-                    command += f" {scene_class}"
-
-                print(f"Executing command: {command}")
-
-                # Run the command and capture output
-                process = subprocess.Popen(
-                    command,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-
-                # Print output in real-time
-                stderr_output = ""
-                for line in process.stdout:
-                    print(line, end='')
-                    # Look for the path output line
-                    if "File ready at" in line:
-                        video_path = line.strip().split("File ready at ")[-1]
-                        print(f"\nVIDEO PATH: {video_path}")
-
-                # Wait for process to complete
-                return_code = process.wait()
-
-                # Capture stderr output
-                stderr_output = process.stderr.read()
+                progress("render_started", f"Manim render attempt {retry_count + 1} started", attempt=retry_count + 1)
+                stderr_parser = ManimProgressParser(progress)
+                return_code = run_manim(temp_file_path, output_dir, scene_class, stderr_parser)
+                stderr_output = stderr_parser.output()
 
                 # Check if the process succeeded
                 if return_code != 0:
                     print(f"Manim render failed with return code {return_code}")
                     print(f"Error output: {stderr_output}")
+                    progress("render_failed", f"Manim render attempt {retry_count + 1} failed, retrying",
+                             attempt=retry_count + 1)
 
                     # Try to fix the code based on the error
                     fixed_code = None
@@ -324,7 +799,6 @@ def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added ma
 
                     retry_count += 1
                     if retry_count < max_retries:
-                        time.sleep(2)  # Add delay between retries
                         continue
                     return False, None
 
@@ -334,12 +808,19 @@ def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added ma
                     video_files.sort(key=os.path.getmtime, reverse=True)
                     latest_video = video_files[0]
                     print(f"\nVIDEO PATH: {latest_video}")
+                    progress("render_done", "Manim render finished", cached=False)
+                    if render_cache:
+                        # Also cached under the code that finally rendered, if a retry had to fix it
+                        rendered_key = render_cache.key(code, requested_scene_class)
+                        try:
+                            render_cache.put(set(cache_keys + [rendered_key]), latest_video)
+                        except OSError as e:
+                            print(f"Error storing render in cache: {e}")
                     return True, latest_video
                 else:
                     print("No video files found in output directory")
                     retry_count += 1
                     if retry_count < max_retries:
-                        time.sleep(2)  # Add delay between retries
                         continue
                     return False, None
 
@@ -356,7 +837,6 @@ def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added ma
             traceback.print_exc()
             retry_count += 1
             if retry_count < max_retries:
-                time.sleep(2)  # Add delay between retries
                 continue
             return False, None
 
@@ -364,40 +844,136 @@ def manim_render(code, output_dir, scene_class=None, max_retries=5):  # Added ma
     return False, None
 
 
-def scene_processing(gemini, prompt, max_retries=5):
+class ScenePlanParser:
+    """
+    Incremental parser for a VideoRequest JSON document arriving in chunks.
+    feed() returns the scenes whose objects were completed by the new text, so
+    each scene can be handed on while the rest of the plan is still streaming.
+    Only string, escape and nesting state is tracked; each completed scene
+    object is then parsed with json.loads.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        self.last_string = None
+        self.scenes_depth = None
+        self.scene_start = None
+        # Set once the "scenes" array has been closed, i.e. the plan wasn't cut short
+        self.complete = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        text = self.text
+        scenes = []
+        for index in range(self.position, len(text)):
+            char = text[index]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    self.last_string = text[self.string_start + 1:index]
+            elif char == '"':
+                self.in_string = True
+                self.string_start = index
+            elif char in "[{":
+                # The top-level "scenes" array, and the scene objects directly inside it
+                if char == "[" and self.stack == ["{"] and self.last_string == "scenes":
+                    self.scenes_depth = 2
+                elif char == "{" and self.scenes_depth is not None and len(self.stack) == self.scenes_depth:
+                    self.scene_start = index
+                self.stack.append(char)
+            elif char in "]}" and self.stack:
+                self.stack.pop()
+                if char == "}" and self.scene_start is not None and len(self.stack) == self.scenes_depth:
+                    scenes.append(json.loads(text[self.scene_start:index + 1]))
+                    self.scene_start = None
+                elif char == "]" and self.scenes_depth is not None and len(self.stack) < self.scenes_depth:
+                    self.scenes_depth = None
+                    self.complete = True
+        self.position = len(text)
+        return scenes
+
+
+def stream_scene_plan(gemini, prompt, max_retries=5):
+    """
+    Stream the scene plan from Gemini, yielding each scene (a dict with title
+    and description) as soon as its JSON object is complete. Opening the
+    stream is retried like any other upstream call. A stream that breaks off
+    before the scene list is closed raises, even after some scenes have been
+    yielded, so a truncated plan never turns into a (cached) partial video.
+    """
     from prompt_video import gemini_prompt
 
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            print(f"Requesting scene processing, attempt {retry_count + 1}")
-            response = gemini.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=gemini_prompt + " " + prompt,
-                config={
-                    'response_mime_type': 'application/json',
-                    'response_schema': VideoRequest
-                }
-            )
+    def open_stream():
+        stream = gemini.models.generate_content_stream(
+            model="gemini-2.0-flash",
+            contents=gemini_prompt + " " + prompt,
+            config={
+                'response_mime_type': 'application/json',
+                'response_schema': VideoRequest
+            }
+        )
+        # Nothing is sent until the first chunk is read, so that's what gets retried
+        return stream, next(stream, None)
+
+    print("Requesting scene processing")
+    stream, chunk = call_with_retry("gemini", open_stream, max_attempts=max_retries)
+    parser = ScenePlanParser()
+    planned = 0
+    while chunk is not None:
+        for scene in parser.feed(chunk.text or ""):
+            planned += 1
+            yield Scene.model_validate(scene).model_dump()
+        chunk = next(stream, None)
+    if not planned:
+        raise ValueError(f"Scene plan has no scenes: {parser.text[:500]}")
+    if not parser.complete:
+        raise ValueError(f"Scene plan stream ended after {planned} scenes, before the scene list was complete")
+
+
+def single_call_scene(client, prompt, progress=no_progress):
+    """
+    SCENE_PLAN_MODE=single_call: plan a one-scene video and write its code in a
+    single codegen request, skipping the Gemini planning round trip. The plan
+    comes back as the code's header comments. Returns (scene, code), or
+    (None, None) if no valid code was produced.
+    """
+    from prompt_video import single_scene_prompt
+
+    code = get_video_gencode(client, single_scene_prompt + " " + prompt, progress=progress)
+    if not code:
+        return None, None
+    header = dict(re.findall(r"^#\s*(Title|Description):\s*(.+)$", code, re.MULTILINE))
+    scene = {"title": header.get("Title", prompt[:80]).strip(), "description": header.get("Description", prompt).strip()}
+    return scene, code
 
-            return response.text
-        except Exception as e:
-            print(f"Scene processing failed: {e}")
-            traceback.print_exc()
-            retry_count += 1
-            if retry_count < max_retries:
-                print(f"Retrying in 3 seconds...")
-                time.sleep(3)
 
-    print("All scene processing attempts failed")
-    return None
+def plan_scenes(gemini, client, prompt, progress=no_progress):
+    """Yield (scene, code) as each scene is planned; code is None unless planning already wrote it"""
+    if SCENE_PLAN_MODE == "single_call":
+        scene, code = single_call_scene(client, prompt, progress)
+        if scene:
+            yield scene, code
+        return
+    for scene in stream_scene_plan(gemini, prompt):
+        yield scene, None
 
 
 def add_audio(gemini, gemini_response_individual, max_attempts=5):
     def attempt_generation(attempt_num):
         try:
             print(f"Attempting audio generation, attempt {attempt_num}")
-            response = gemini.models.generate_content(
+            response = call_with_retry(
+                "gemini",
+                gemini.models.generate_content,
                 model="gemini-2.0-flash",
                 contents=gemini_response_individual,
             )
@@ -405,19 +981,12 @@ def add_audio(gemini, gemini_response_individual, max_attempts=5):
             python_code_audio = extract_python_code(temp_response)
             if python_code_audio:
                 # Validate the code
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-                    temp_file.write(python_code_audio)
-                    temp_file_path = temp_file.name
-
-                is_valid = compile_code(python_code_audio, temp_file_path)
-
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-
-                if is_valid:
+                errors = validate_scene_code(python_code_audio)
+                if not errors:
                     return python_code_audio
                 else:
-                    print(f"Audio code generation attempt {attempt_num} produced invalid code")
+                    print(f"Audio code generation attempt {attempt_num} produced invalid code:")
+                    print(format_validation_errors(errors))
                     return None
             else:
                 print(f"Audio code generation attempt {attempt_num} failed to extract code")
@@ -432,7 +1001,6 @@ def add_audio(gemini, gemini_response_individual, max_attempts=5):
         result = attempt_generation(i + 1)
         if result:
             return result
-        time.sleep(1)  # Brief delay between attempts
 
     print("All sequential audio generation attempts failed, trying parallel approach")
 
@@ -472,37 +1040,81 @@ def clear_directory(directory_path):
         return False
 
 
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def video_url(asset_path):
+    return f"{VIDEO_SERVER_URL}/{os.path.basename(asset_path)}"
+
+
+def prune_video_server(keep=None):
+    """
+    Apply the retention policy to served videos: drop anything older than
+    VIDEO_RETENTION_SECONDS, then the oldest files until the directory fits in
+    VIDEO_SERVER_MAX_BYTES. `keep` (the video just published) is never removed.
+    """
+    now = time.time()
+    videos = []
+    for video in Path(VIDEO_SERVER_DIR).glob("*.mp4"):
+        try:
+            stat = video.stat()
+        except FileNotFoundError:
+            continue
+        videos.append((stat.st_mtime, stat.st_size, video))
+    videos.sort()
+
+    total = sum(size for _, size, _ in videos)
+    for mtime, size, video in videos:
+        if keep and video.resolve() == Path(keep).resolve():
+            continue
+        if now - mtime <= VIDEO_RETENTION_SECONDS and total <= VIDEO_SERVER_MAX_BYTES:
+            continue
+        try:
+            video.unlink()
+            total -= size
+            print(f"Deleted video past retention: {video}")
+        except Exception as e:
+            print(f"Error deleting file {video}: {e}")
+
+
 def move_video_to_video_server(video_path, session_id):
-    """Move a video file to the video_server directory"""
+    """
+    Publish a video to the video_server directory under a content-hashed
+    filename. Names never get reused for different bytes, so concurrent jobs
+    can't clobber each other and the files can be cached by clients forever.
+    """
     if not video_path or not os.path.exists(video_path):
         print(f"Video path does not exist: {video_path}")
         return None
 
     # Create video_server directory if it doesn't exist
-    dest_dir = "video_server"
-    Path(dest_dir).mkdir(parents=True, exist_ok=True)
-
-    # Clean any existing mp4 files in the directory
-    for existing_file in Path(dest_dir).glob("*.mp4"):
-        try:
-            existing_file.unlink()
-            print(f"Deleted existing file: {existing_file}")
-        except Exception as e:
-            print(f"Error deleting file {existing_file}: {e}")
-
-    # Set the destination filename to temp.mp4
-    dest_path = os.path.join(dest_dir, "temp.mp4")
+    Path(VIDEO_SERVER_DIR).mkdir(parents=True, exist_ok=True)
 
     try:
-        # Copy the file
-        shutil.copy2(video_path, dest_path)
+        dest_path = os.path.join(VIDEO_SERVER_DIR, f"{file_digest(video_path)[:32]}.mp4")
+        if os.path.exists(dest_path):
+            # Same content already published; refresh it so retention keeps it around
+            os.utime(dest_path)
+        else:
+            # Copy next to the destination and rename, so the server never sees a partial file
+            temp_path = f"{dest_path}.{session_id}.tmp"
+            shutil.copy2(video_path, temp_path)
+            os.replace(temp_path, dest_path)
+            os.utime(dest_path)
         print(f"Video copied to: {dest_path}")
-        return dest_path
     except Exception as e:
         print(f"Error moving video: {e}")
         traceback.print_exc()
         return None
 
+    prune_video_server(keep=dest_path)
+    return dest_path
+
 
 def clean_output_dir(output_dir):
     """Delete the output directory and all its contents"""
@@ -518,6 +1130,224 @@ def clean_output_dir(output_dir):
         return False
 
 
+def probe_stream_signature(video_path):
+    """
+    Return (signature, duration, has_audio) for a clip, where signature holds
+    everything the concat demuxer needs to match across inputs for a stream copy
+    """
+    result = subprocess.run(
+        [FFPROBE_BIN, "-v", "error",
+         "-show_entries", "stream=codec_type,codec_name,width,height,r_frame_rate,pix_fmt,time_base,"
+                          "sample_rate,channels:format=duration",
+         "-of", "json", video_path],
+        capture_output=True, text=True, check=True
+    )
+    info = json.loads(result.stdout)
+    signature = []
+    has_audio = False
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "video":
+            signature.append(("video", stream.get("codec_name"), stream.get("width"), stream.get("height"),
+                              stream.get("r_frame_rate"), stream.get("pix_fmt"), stream.get("time_base")))
+        elif stream.get("codec_type") == "audio":
+            has_audio = True
+            signature.append(("audio", stream.get("codec_name"), stream.get("sample_rate"),
+                              stream.get("channels"), stream.get("time_base")))
+    duration = float(info.get("format", {}).get("duration") or 0)
+    return tuple(signature), duration, has_audio
+
+
+def concat_stream_copy(video_paths, output_path):
+    """Join clips with the concat demuxer without re-encoding; they must share codecs and parameters"""
+    list_path = output_path + ".txt"
+    with open(list_path, "w") as list_file:
+        for path in video_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    try:
+        subprocess.run(
+            [FFMPEG_BIN, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", "-movflags", "+faststart", output_path],
+            capture_output=True, text=True, check=True
+        )
+    finally:
+        os.remove(list_path)
+
+
+def concat_transcode(video_paths, output_path, probes):
+    """
+    Join clips in a single re-encode. Every clip is scaled and padded to the
+    first clip's frame size and rate, and clips without a voiceover get silence
+    so the concat filter always sees one video and one audio stream per input.
+    """
+    first_video = next(stream for stream in probes[0][0] if stream[0] == "video")
+    width, height, frame_rate = first_video[2], first_video[3], first_video[4]
+
+    command = [FFMPEG_BIN, "-y", "-v", "error"]
+    for path in video_paths:
+        command += ["-i", path]
+
+    filters = []
+    for i, (_, duration, has_audio) in enumerate(probes):
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={frame_rate},format=yuv420p[v{i}]"
+        )
+        if has_audio:
+            filters.append(f"[{i}:a]aresample=44100,aformat=channel_layouts=stereo[a{i}]")
+        else:
+            filters.append(f"anullsrc=r=44100:cl=stereo,atrim=duration={duration:.3f}[a{i}]")
+    inputs = "".join(f"[v{i}][a{i}]" for i in range(len(video_paths)))
+    filters.append(f"{inputs}concat=n={len(video_paths)}:v=1:a=1[v][a]")
+
+    command += ["-filter_complex", ";".join(filters), "-map", "[v]", "-map", "[a]",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+                "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", output_path]
+    subprocess.run(command, capture_output=True, text=True, check=True)
+
+
+def concat_videos(video_paths, output_path):
+    """
+    Stitch the scene clips into one video, in order. Manim renders every scene
+    with the same settings, so the clips normally share codecs and resolution
+    and can be joined with a stream copy; a single transcode is only used when
+    they differ (e.g. some scenes ended up with a voiceover track and some did not).
+    Returns the path of the stitched video, or the last clip if stitching failed.
+    """
+    if len(video_paths) == 1:
+        return video_paths[0]
+
+    try:
+        probes = [probe_stream_signature(path) for path in video_paths]
+        if all(signature == probes[0][0] for signature, _, _ in probes):
+            print(f"Concatenating {len(video_paths)} scenes with stream copy")
+            concat_stream_copy(video_paths, output_path)
+        else:
+            print(f"Scene clips differ in codec or resolution, transcoding {len(video_paths)} scenes")
+            concat_transcode(video_paths, output_path, probes)
+        print(f"Final video stitched: {output_path}")
+        return output_path
+    except subprocess.CalledProcessError as e:
+        print(f"ffmpeg failed while stitching scenes: {e.stderr}")
+    except Exception as e:
+        print(f"Error stitching scenes: {e}")
+        traceback.print_exc()
+
+    print("Falling back to the last rendered scene")
+    return video_paths[-1]
+
+
+def generate_audio_code(gemini, code, scene_number):
+    """Wrap a scene's Manim code in voiceover blocks; returns None if that failed"""
+    try:
+        from prompt_video import audio_prompt
+        print("Generating audio code...")
+        return add_audio(gemini, audio_prompt + " " + code)
+    except Exception as e:
+        print(f"Error generating audio code for scene {scene_number}: {e}")
+        traceback.print_exc()
+        return None
+
+
+def render_scene(gemini, client, scene, i, output_dir, progress=no_progress, code=None):
+    """
+    Generate, render and voice one scene. Returns the path of the best video
+    produced for it (with audio if that worked), or None if every attempt failed.
+    Each scene renders into its own output directory so concurrent scenes
+    never pick up each other's files.
+
+    With VOICEOVER_PIPELINE=render_once the voiceover code is generated up
+    front and only that is rendered, so a scene costs one Manim render instead
+    of two; the silent code is rendered only if the voiceover version fails.
+    silent_first keeps the old behaviour of rendering silently and then again with audio.
+
+    `code` already written during planning (single_call mode) is used for the
+    first attempt; retries generate fresh code.
+    """
+    title = scene["title"]
+    description = scene["description"]
+    scene_prompt = title + " " + description
+
+    print(f"\nProcessing scene {i + 1}: {title}")
+    print(f"Description: {description}")
+
+    scene_video = None
+    planned_code, code = code, None
+
+    # Retry loop for each scene
+    scene_attempts = 0
+    max_scene_attempts = 5
+    while scene_attempts < max_scene_attempts:
+        # Generate video code
+        code = planned_code or get_video_gencode(client, scene_prompt, progress=progress)
+        planned_code = None
+        if not code:
+            print(
+                f"Failed to generate valid Manim code for scene {i + 1}. Attempt {scene_attempts + 1} of {max_scene_attempts}.")
+            scene_attempts += 1
+            continue
+        progress("code_generated", f"Code generated for scene {i + 1}")
+
+        if VOICEOVER_PIPELINE == "render_once":
+            audio_code = generate_audio_code(gemini, code, i + 1)
+            if audio_code:
+                progress("audio_code_generated", f"Voiceover code generated for scene {i + 1}")
+                print("Rendering with audio...")
+                audio_render_success, audio_video_path = manim_render(audio_code, output_dir, max_retries=5,
+                                                                      progress=progress)
+                if audio_render_success and audio_video_path:
+                    print(f"Scene {i + 1} with audio rendered successfully: {audio_video_path}")
+                    progress("audio_done", f"Scene {i + 1} rendered with audio")
+                    return audio_video_path
+                print(f"Failed to render scene {i + 1} with audio. Rendering without audio.")
+            else:
+                print(f"Failed to generate audio code for scene {i + 1}. Rendering without audio.")
+
+        # Render the video with enhanced retry logic
+        render_success, video_path = manim_render(code, output_dir, max_retries=5, progress=progress)
+        if render_success and video_path:
+            scene_video = video_path
+            print(f"Video for scene {i + 1} rendered successfully: {video_path}")
+            progress("scene_rendered", f"Scene {i + 1} rendered")
+            break  # Succeeded, exit the retry loop
+        else:
+            print(
+                f"Failed to render video for scene {i + 1}. Attempt {scene_attempts + 1} of {max_scene_attempts}.")
+            scene_attempts += 1
+            # Try with some common code modifications
+            if scene_attempts < max_scene_attempts:
+                continue
+
+    # If all scene attempts failed, the remaining scenes still go ahead
+    if scene_attempts >= max_scene_attempts:
+        print(f"All attempts failed for scene {i + 1}. Moving to next scene.")
+        progress("scene_failed", f"All attempts failed for scene {i + 1}")
+        return None
+
+    # The render_once pipeline already tried (and gave up on) the voiceover
+    if VOICEOVER_PIPELINE == "render_once":
+        return scene_video
+
+    # Add audio
+    audio_code = generate_audio_code(gemini, code, i + 1)
+    if audio_code:
+        progress("audio_code_generated", f"Voiceover code generated for scene {i + 1}")
+        print("Rendering with audio...")
+        audio_render_success, audio_video_path = manim_render(audio_code, output_dir, max_retries=5,
+                                                              progress=progress)
+        if audio_render_success and audio_video_path:
+            print(f"Scene {i + 1} with audio rendered successfully: {audio_video_path}")
+            progress("audio_done", f"Scene {i + 1} rendered with audio")
+            # Replace the non-audio version with the audio version
+            scene_video = audio_video_path
+        else:
+            print(f"Failed to render scene {i + 1} with audio. Keeping non-audio version.")
+    else:
+        print(f"Failed to generate audio code for scene {i + 1}. Keeping non-audio version.")
+
+    return scene_video
+
+
 def process_video_request(prompt, session_id):
     """Process a video generation request"""
     max_overall_attempts = 5  # Number of times to try the entire process if needed
@@ -527,104 +1357,60 @@ def process_video_request(prompt, session_id):
         try:
             print(f"Overall video generation attempt {attempt + 1} of {max_overall_attempts}")
 
-            # Initialize environment
+            # Shared clients, created on first use and reused by every attempt and job
             gemini, client = setup_environment()
             if not gemini or not client:
                 print("Failed to initialize environment. Retrying...")
                 attempt += 1
-                time.sleep(5)
                 continue
 
             output_dir = f"output_{session_id}"
 
-            # Get scene information
+            # Each scene starts codegen and rendering as soon as the plan stream completes it;
+            # results stay in scene order
             print("Processing scene information...")
-            gemini_response = scene_processing(gemini, prompt)
-            if not gemini_response:
-                print("Failed to process scene information. Retrying...")
-                attempt += 1
-                time.sleep(5)
-                continue
-
+            emit_progress(session_id, "scene_planning", "Planning scenes")
             video_paths = []
             try:
-                import json
-                gemini_response_parsed = json.loads(gemini_response)
-                print("Scene information received:")
-                print(gemini_response_parsed)
-
-                # Process each scene
-                for i, scene in enumerate(gemini_response_parsed["scenes"]):
-                    title = scene["title"]
-                    description = scene["description"]
-                    scene_prompt = title + " " + description
-
-                    print(f"\nProcessing scene {i + 1}: {title}")
-                    print(f"Description: {description}")
-
-                    # Retry loop for each scene
-                    scene_attempts = 0
-                    max_scene_attempts = 5
-                    while scene_attempts < max_scene_attempts:
-                        # Generate video code
-                        code = get_video_gencode(client, scene_prompt)
-                        if not code:
-                            print(
-                                f"Failed to generate valid Manim code for scene {i + 1}. Attempt {scene_attempts + 1} of {max_scene_attempts}.")
-                            scene_attempts += 1
-                            time.sleep(3)
-                            continue
-
-                        # Render the video with enhanced retry logic
-                        render_success, video_path = manim_render(code, output_dir, max_retries=5)
-                        if render_success and video_path:
-                            # Add to video paths list
-                            video_paths.append(video_path)
-                            print(f"Video for scene {i + 1} rendered successfully: {video_path}")
-                            break  # Succeeded, exit the retry loop
-                        else:
-                            print(
-                                f"Failed to render video for scene {i + 1}. Attempt {scene_attempts + 1} of {max_scene_attempts}.")
-                            scene_attempts += 1
-                            # Try with some common code modifications
-                            if scene_attempts < max_scene_attempts:
-                                time.sleep(3)
-                                continue
-
-                    # If all scene attempts failed, continue to the next scene
-                    if scene_attempts >= max_scene_attempts:
-                        print(f"All attempts failed for scene {i + 1}. Moving to next scene.")
-                        continue
-
-                    # Add audio
+                with concurrent.futures.ThreadPoolExecutor(max_workers=SCENE_WORKERS) as executor:
+                    futures = []
+                    titles = []
                     try:
-                        from prompt_video import audio_prompt
-                        print("Generating audio code...")
-                        gemini_response_individual = audio_prompt + " " + code
-                        audio_code = add_audio(gemini, gemini_response_individual)
-
-                        if audio_code:
-                            print("Rendering with audio...")
-                            audio_render_success, audio_video_path = manim_render(audio_code, output_dir, max_retries=5)
-                            if audio_render_success and audio_video_path:
-                                print(f"Scene {i + 1} with audio rendered successfully: {audio_video_path}")
-                                # Replace the non-audio version with the audio version in our list
-                                if audio_video_path:
-                                    video_paths[-1] = audio_video_path
-                            else:
-                                print(f"Failed to render scene {i + 1} with audio. Keeping non-audio version.")
-                        else:
-                            print(f"Failed to generate audio code for scene {i + 1}. Keeping non-audio version.")
-                    except Exception as e:
-                        print(f"Error processing audio for scene {i + 1}: {e}")
-                        traceback.print_exc()
+                        for scene, code in plan_scenes(gemini, client, prompt,
+                                                       functools.partial(emit_progress, session_id)):
+                            i = len(futures)
+                            print(f"Scene {i + 1} planned: {scene}")
+                            titles.append(scene["title"])
+                            emit_progress(session_id, "scene_planned", f"Scene {i + 1} planned: {scene['title']}",
+                                          scene=i + 1)
+                            futures.append(executor.submit(render_scene, gemini, client, scene, i,
+                                                           f"{output_dir}/scene_{i + 1}",
+                                                           functools.partial(emit_progress, session_id, scene=i + 1),
+                                                           code))
+                    except Exception:
+                        # The plan failed part way: drop scenes that haven't started and retry the attempt
+                        for future in futures:
+                            future.cancel()
+                        raise
+                    emit_progress(session_id, "scene_plan_ready", f"Scene plan ready with {len(titles)} scenes",
+                                  scenes=titles)
+                    for i, future in enumerate(futures):
+                        try:
+                            scene_video = future.result()
+                        except Exception as e:
+                            print(f"Error processing scene {i + 1}: {e}")
+                            traceback.print_exc()
+                            continue
+                        if scene_video:
+                            video_paths.append(scene_video)
 
                 print("\nAll scenes processed.")
 
                 # Move final video to video_server directory if we have any
                 if video_paths:
-                    # Use the last video as the final one
-                    final_video_path = video_paths[-1]
+                    # Stitch every scene, in order, into the final video
+                    final_video_path = concat_videos(video_paths, os.path.join(output_dir, "final.mp4"))
+                    emit_progress(session_id, "stitch_done", f"Stitched {len(video_paths)} scenes into the final video")
                     asset_path = move_video_to_video_server(final_video_path, session_id)
 
                     # Clean up output directory
@@ -634,33 +1420,35 @@ def process_video_request(prompt, session_id):
                         return {
                             "status": "success",
                             "message": "Video generated successfully",
-                            "video_path": asset_path
+                            "video_path": asset_path,
+                            "video_url": video_url(asset_path)
                         }
 
                 # If we get here without returning, that means we didn't successfully process any videos
+                # Scene failures are local (codegen, validation, rendering), so retry right away
                 print("No videos were successfully generated in this attempt.")
                 attempt += 1
-                time.sleep(5)  # Wait before retrying the whole process
                 continue
 
             except json.JSONDecodeError as e:
                 print(f"Failed to parse scene information: {e}")
-                print(f"Raw response: {gemini_response}")
                 attempt += 1
-                time.sleep(5)
                 continue
             except Exception as e:
                 print(f"Error processing scenes: {e}")
                 traceback.print_exc()
                 attempt += 1
-                time.sleep(5)
+                # Only upstream trouble is worth waiting out; local errors are retried right away
+                if is_transient(e):
+                    backoff(attempt)
                 continue
 
         except Exception as e:
             print(f"Unexpected error in process_video_request: {e}")
             traceback.print_exc()
             attempt += 1
-            time.sleep(5)
+            if is_transient(e):
+                backoff(attempt)
             continue
 
     # If we've exhausted all retries and still don't have a video, return error
@@ -670,10 +1458,166 @@ def process_video_request(prompt, session_id):
     }
 
 
+def normalize_prompt(prompt):
+    """Case and whitespace don't change what gets generated"""
+    return " ".join(prompt.lower().split())
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+class VideoResultCache:
+    """
+    Persistent cache of finished videos keyed on the normalized prompt hash,
+    so a prompt that was already generated is answered without running the
+    pipeline again. The index lives in SQLite and points at the published,
+    content-hashed file in video_server/; no second copy is kept. Entries
+    expire after `ttl`, or sooner once the retention policy deletes the file.
+    """
+
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS video_results (
+                prompt_hash TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                video_path TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def get(self, key):
+        """Path of the cached video for a prompt hash, or None if missing or expired"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT video_path, created_at FROM video_results WHERE prompt_hash = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            video_path, created_at = row
+            if time.time() - created_at > self.ttl or not os.path.exists(video_path):
+                # The file itself belongs to video_server/ and its retention policy
+                with self.db:
+                    self.db.execute("DELETE FROM video_results WHERE prompt_hash = ?", (key,))
+                return None
+        return video_path
+
+    def put(self, key, prompt, video_path):
+        """Remember the published video for a prompt hash"""
+        with self.lock:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO video_results (prompt_hash, prompt, video_path, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, prompt, os.path.abspath(video_path), time.time())
+                )
+        print(f"Cached video for prompt {key[:16]}")
+
+
+video_result_cache = VideoResultCache(VIDEO_CACHE_PATH, VIDEO_CACHE_TTL) if VIDEO_CACHE_ENABLED else None
+
+
+class JobScheduler:
+    """
+    Bounded priority queue of video jobs drained by a fixed pool of worker
+    threads, so a burst of requests waits its turn instead of oversubscribing
+    the CPU with Manim processes. Higher priority jobs run first; equal
+    priorities run in arrival order.
+    """
+
+    def __init__(self, workers, max_queued):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.waiting = []  # heap of (-priority, seq, job_id, func)
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.threads = []
+        # Moving average of job run time, used to estimate retry hints
+        self.average_duration = 60.0
+
+    def start(self):
+        with self.condition:
+            if self.threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"video-worker-{n + 1}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, job_id, func, priority=0):
+        """Queue a job; returns False when the queue is full"""
+        self.start()
+        with self.condition:
+            if len(self.waiting) >= self.max_queued:
+                return False
+            heapq.heappush(self.waiting, (-priority, next(self.counter), job_id, func))
+            self.condition.notify()
+        return True
+
+    def position(self, job_id):
+        """1-based place in line for a waiting job, or None once it has started"""
+        with self.condition:
+            for position, entry in enumerate(sorted(self.waiting), start=1):
+                if entry[2] == job_id:
+                    return position
+        return None
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        return max(5, int(self.average_duration / self.workers))
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.waiting:
+                    self.condition.wait()
+                _, _, job_id, func = heapq.heappop(self.waiting)
+            start = time.time()
+            try:
+                func()
+            except Exception as e:
+                print(f"Error in job {job_id}: {e}")
+                traceback.print_exc()
+            self.average_duration = 0.8 * self.average_duration + 0.2 * (time.time() - start)
+
+
+scheduler = JobScheduler(VIDEO_WORKERS, VIDEO_QUEUE_SIZE)
+
 # Store job status
 job_status = {}
 
 
+def finish_job(session_id, result):
+    """Store a job's final result and close its event stream with a done or error event"""
+    job_status[session_id] = result
+    events = job_events.get(session_id)
+    if events is not None:
+        stage = "done" if result.get("status") == "success" else "error"
+        details = {k: v for k, v in result.items() if k not in ("status", "message")}
+        events.emit(stage, result.get("message", ""), **details)
+    expire_finished_jobs()
+
+
+def expire_finished_jobs():
+    """Forget the status and events of jobs that finished more than JOB_RETENTION_SECONDS ago"""
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id, events in list(job_events.items()):
+        if events.finished_at is not None and events.finished_at < cutoff:
+            # Open /job-events streams keep their own reference and still see the terminal event
+            job_events.pop(job_id, None)
+            job_status.pop(job_id, None)
+
+
+# Prompt hash -> job ID of the job currently generating it, so identical requests share one run
+inflight_jobs = {}
+inflight_lock = threading.Lock()
+
+
 @app.route('/generate-video', methods=['POST'])
 def generate_video():
     if not request.is_json:
@@ -685,65 +1629,166 @@ def generate_video():
     if not prompt:
         return jsonify({"status": "error", "message": "Prompt is required"}), 400
 
-    # Create video_server directory if it doesn't exist
-    video_server_dir = "video_server"
-    Path(video_server_dir).mkdir(parents=True, exist_ok=True)
-
-    # Clear any existing mp4 files
-    for existing_file in Path(video_server_dir).glob("*.mp4"):
-        try:
-            existing_file.unlink()
-            print(f"Deleted existing file: {existing_file}")
-        except Exception as e:
-            print(f"Error deleting file {existing_file}: {e}")
-
-    # Generate a unique session ID
-    session_id = str(uuid.uuid4())
-
-    # Store initial status
-    job_status[session_id] = {
-        "status": "processing",
-        "message": "Video generation started",
-        "created_at": time.time()
-    }
-
-    # Start processing in a separate thread
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Priority must be an integer"}), 400
+
+    key = prompt_key(prompt)
+
+    # Serve a recent identical prompt from the result cache
+    cached_video = video_result_cache.get(key) if video_result_cache else None
+    if cached_video:
+        session_id = str(uuid.uuid4())
+        asset_path = move_video_to_video_server(cached_video, session_id)
+        if asset_path:
+            print(f"Video cache hit for prompt {key[:16]}")
+            job_events[session_id] = JobEvents()
+            finish_job(session_id, {
+                "status": "success",
+                "message": "Video generated successfully",
+                "video_path": asset_path,
+                "video_url": video_url(asset_path),
+                "cached": True
+            })
+            return jsonify({
+                "status": "accepted",
+                "message": "Video served from cache",
+                "job_id": session_id
+            })
+
+    # Start processing on a worker thread once one is free
     def process_job():
+        job_status[session_id] = {
+            "status": "processing",
+            "message": "Video generation started",
+            "created_at": job_status[session_id]["created_at"]
+        }
+        emit_progress(session_id, "started", "Video generation started")
+
         try:
             result = process_video_request(prompt, session_id)
-            job_status[session_id] = result
+            if result.get("status") == "success" and video_result_cache:
+                try:
+                    video_result_cache.put(key, prompt, result["video_path"])
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Error caching video result: {e}")
+            finish_job(session_id, result)
         except Exception as e:
-            job_status[session_id] = {
+            finish_job(session_id, {
                 "status": "error",
                 "message": f"Unexpected error: {str(e)}"
-            }
+            })
             print(f"Error in job {session_id}: {e}")
             traceback.print_exc()
-
-    thread = threading.Thread(target=process_job)
-    thread.daemon = True
-    thread.start()
+        finally:
+            with inflight_lock:
+                inflight_jobs.pop(key, None)
+
+    with inflight_lock:
+        # Attach to an identical job that is still running instead of starting another pipeline
+        inflight_job_id = inflight_jobs.get(key)
+        if inflight_job_id:
+            print(f"Attaching request to in-flight job {inflight_job_id}")
+            return jsonify({
+                "status": "accepted",
+                "message": "Attached to an identical video generation job",
+                "job_id": inflight_job_id
+            })
+
+        # Generate a unique session ID. Its status and events exist before other requests can attach to it
+        session_id = str(uuid.uuid4())
+        job_status[session_id] = {
+            "status": "queued",
+            "message": "Waiting for a video worker",
+            "created_at": time.time()
+        }
+        job_events[session_id] = JobEvents()
+        emit_progress(session_id, "queued", "Waiting for a video worker")
+        inflight_jobs[key] = session_id
+
+        # Submitted under the lock, so a rejected job is gone before anyone can attach to it
+        admitted = scheduler.submit(session_id, process_job, priority)
+        if not admitted:
+            inflight_jobs.pop(key, None)
+            del job_status[session_id]
+            del job_events[session_id]
+
+    if not admitted:
+        # Admission control: the queue is full, so ask the client to come back later
+        retry_after = scheduler.retry_after()
+        response = jsonify({
+            "status": "error",
+            "message": "Too many video jobs queued, try again later",
+            "retry_after": retry_after
+        })
+        response.headers["Retry-After"] = str(retry_after)
+        return response, 429
 
     return jsonify({
         "status": "accepted",
-        "message": "Video generation job started",
-        "job_id": session_id
+        "message": "Video generation job queued",
+        "job_id": session_id,
+        "queue_position": scheduler.position(session_id)
     })
 
 
 @app.route('/job-status/<job_id>', methods=['GET'])
 def check_job_status(job_id):
-    if job_id not in job_status:
+    status = job_status.get(job_id)
+    if status is None:
         return jsonify({"status": "error", "message": "Job not found"}), 404
 
-    return jsonify(job_status[job_id])
+    status = dict(status)
+    if status["status"] == "queued":
+        status["queue_position"] = scheduler.position(job_id)
+    return jsonify(status)
+
+
+@app.route('/codegen-stats', methods=['GET'])
+def get_codegen_stats():
+    """Per-candidate latency and success rate of speculative code generation"""
+    return jsonify(codegen_stats.summary())
+
+
+@app.route('/job-events/<job_id>', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Server-Sent Events stream of a job's progress. Every event is replayed from
+    the start (or from Last-Event-ID when the browser reconnects), then new ones
+    are pushed as stages change until the job finishes.
+    """
+    events = job_events.get(job_id)
+    if events is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_event_id = 0
+
+    def generate():
+        sent = last_event_id
+        while True:
+            batch, finished = events.wait_for(sent, timeout=15)
+            if not batch:
+                if finished:
+                    return
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            for event in batch:
+                yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+                sent = event["id"]
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 def main():
     try:
         # Ensure video_server directory exists
-        video_server_dir = "video_server"
-        Path(video_server_dir).mkdir(parents=True, exist_ok=True)
+        Path(VIDEO_SERVER_DIR).mkdir(parents=True, exist_ok=True)
 
         print("Starting API server on port 5555")
         app.run(host='0.0.0.0', port=5555, debug=False, threaded=True)
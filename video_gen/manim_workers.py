@@ -0,0 +1,179 @@
+import multiprocessing
+import queue
+import runpy
+import sys
+import threading
+import time
+import traceback
+
+import voiceover_cache
+
+
+class PipeStderr:
+    """Stands in for sys.stderr in a worker, forwarding everything written (progress bars included) to the parent"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, text):
+        if text:
+            self.conn.send(("stderr", text))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def render_source(source_path, output_dir, scene_class, dry_run=False):
+    """Render the scene defined in source_path with the already-imported Manim, like `manim -ql` would"""
+    import manim
+
+    options = {"media_dir": output_dir, "quality": "low_quality", "preview": False, "input_file": source_path,
+               "dry_run": dry_run}
+    with manim.tempconfig(options):
+        namespace = runpy.run_path(source_path, run_name="__manim_scene__")
+        scenes = [
+            obj for obj in namespace.values()
+            if isinstance(obj, type) and issubclass(obj, manim.Scene) and obj.__module__ == "__manim_scene__"
+        ]
+        if scene_class:
+            scenes = [scene for scene in scenes if scene.__name__ == scene_class]
+        if not scenes:
+            raise ValueError(f"No scene class {scene_class or ''} found in {source_path}")
+        scenes[0]().render()
+
+
+def worker_main(conn):
+    """Worker process loop: import Manim once, then render every scene sent over the pipe"""
+    try:
+        import manim
+    except Exception as e:
+        conn.send(("ready", False, f"{type(e).__name__}: {e}"))
+        return
+    # Voiceover scenes rendered here synthesize through the shared TTS cache
+    voiceover_cache.install()
+    conn.send(("ready", True, getattr(manim, "__version__", "unknown")))
+
+    real_stderr = sys.stderr
+    while True:
+        try:
+            source_path, output_dir, scene_class, dry_run = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        sys.stderr = PipeStderr(conn)
+        try:
+            render_source(source_path, output_dir, scene_class, dry_run)
+            result = ("result", 0, "")
+        except BaseException:
+            # The traceback plays the part of a failed `manim` command's stderr
+            result = ("result", 1, traceback.format_exc())
+        finally:
+            sys.stderr = real_stderr
+        conn.send(result)
+
+
+class WorkerUnavailable(Exception):
+    pass
+
+
+class ManimWorker:
+    """One long-lived process with Manim imported, rendering one scene at a time"""
+
+    def __init__(self, context, startup_timeout):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        if not self.conn.poll(startup_timeout):
+            self.stop()
+            raise WorkerUnavailable("Manim worker did not start in time")
+        _, ready, detail = self.conn.recv()
+        if not ready:
+            self.stop()
+            raise WorkerUnavailable(f"Manim can't be imported in worker: {detail}")
+
+    def render(self, source_path, output_dir, scene_class, on_stderr, timeout, dry_run=False):
+        """Returns (return_code, error_output) like a `manim` subprocess; raises if the worker dies or hangs"""
+        self.jobs += 1
+        self.conn.send((source_path, output_dir, scene_class, dry_run))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Render took longer than {timeout}s")
+            if not self.conn.poll(min(remaining, 1.0)):
+                if not self.process.is_alive():
+                    raise EOFError(f"Worker exited with code {self.process.exitcode}")
+                continue
+            message = self.conn.recv()
+            if message[0] == "stderr":
+                on_stderr(message[1])
+            else:
+                return message[1], message[2]
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def stop(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+
+class ManimWorkerPool:
+    """
+    Pool of warm Manim worker processes, so a render doesn't pay for Python
+    startup and the Manim/numpy imports. Workers are started on demand up to
+    `size`, and replaced after `max_jobs` renders (to shed leaked state) or as
+    soon as one crashes or hangs. If Manim can't be imported in a worker the
+    pool marks itself unavailable and callers fall back to the `manim` CLI.
+    """
+
+    def __init__(self, size, max_jobs, render_timeout, startup_timeout=120):
+        self.max_jobs = max_jobs
+        self.render_timeout = render_timeout
+        self.startup_timeout = startup_timeout
+        self.available = True
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = queue.LifoQueue()
+        # spawn, since forking a process that runs Flask and thread pools isn't safe
+        self.context = multiprocessing.get_context("spawn")
+
+    def render(self, source_path, output_dir, scene_class, on_stderr, dry_run=False):
+        """
+        Render on a warm worker; returns (return_code, error_output). A dry run
+        executes the scene without writing any video, to check that it works.
+        """
+        with self.slots:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                try:
+                    worker = ManimWorker(self.context, self.startup_timeout)
+                except WorkerUnavailable:
+                    self.available = False
+                    raise
+
+            try:
+                result = worker.render(source_path, output_dir, scene_class, on_stderr, self.render_timeout, dry_run)
+            except (EOFError, OSError, TimeoutError) as e:
+                worker.stop()
+                return -1, f"Manim worker failed ({type(e).__name__}: {e}), exit code {worker.process.exitcode}"
+
+            if worker.jobs >= self.max_jobs or not worker.alive():
+                worker.stop()
+            else:
+                self.idle.put(worker)
+            return result
+
+    def shutdown(self):
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                return
@@ -60,3 +60,9 @@ for the last play, you don't need to put the run_time=tracker.duration because i
 in the audio text, you need to put information about the topic not the code or the scene. keep the audio short and crisp talking about the equations and headings and visualizations in really short sentences. do not put thank you or anything like that. just put the information about the topic in the audio.
 give me the entire code. Please don't explain or say transitioning to anything. Your Job is to just add audio voice over and explain what's happening in the equations and headings, not talk about the transitions. 
  """
+
+# Sent along with system_prompt (the codegen instructions) by get_video_gencode, so it only adds the scene header
+single_scene_prompt = """
+Write the code for one short scene for the request below. Start the code with two comment lines describing the
+scene, "# Title: <title of the scene>" and "# Description: <short description of the scene>". The request is:
+"""
@@ -0,0 +1,151 @@
+import os
+import random
+import threading
+import time
+
+# HTTP statuses that mean "try again later" rather than "this request is wrong"
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+THROTTLING_MARKERS = ("rate limit", "resource_exhausted", "too many requests", "overloaded", "unavailable")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second on average, with
+    bursts of up to `burst`. acquire() blocks until a token is free; a
+    reservation larger than the burst is taken in burst-sized chunks.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while tokens > 0:
+            chunk = min(tokens, self.burst)
+            self._acquire_chunk(chunk)
+            tokens -= chunk
+
+    def _acquire_chunk(self, tokens):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self, seconds):
+        """Hold every caller back for `seconds`, e.g. after the provider answered 429 with Retry-After"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter"): attempt n waits a random time up to base * 2^n, capped"""
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def provider_limiter(provider, default_rate, default_burst):
+    rate = float(os.getenv(f"{provider.upper()}_RATE_LIMIT", str(default_rate)))
+    burst = int(os.getenv(f"{provider.upper()}_RATE_BURST", str(default_burst)))
+    return TokenBucket(rate, burst)
+
+
+# One bucket per upstream provider, shared by every job and thread in the process
+limiters = {
+    "deepseek": provider_limiter("deepseek", 5, 10),
+    "gemini": provider_limiter("gemini", 5, 10),
+    "elevenlabs": provider_limiter("elevenlabs", 2, 5),
+}
+
+default_policy = RetryPolicy(
+    max_attempts=int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "5")),
+    base_delay=float(os.getenv("UPSTREAM_BACKOFF_BASE", "1.0")),
+    max_delay=float(os.getenv("UPSTREAM_BACKOFF_MAX", "30.0")),
+)
+
+
+def status_code(exc):
+    """HTTP status of an SDK error (OpenAI and google-genai both expose one), if any"""
+    for attribute in ("status_code", "code", "status"):
+        value = getattr(exc, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after(exc):
+    """Seconds the provider asked us to wait via a Retry-After header, if it did"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(exc):
+    """
+    Whether an upstream error is worth retrying: throttling, server errors,
+    timeouts and dropped connections. Anything else (bad request, auth, ...)
+    fails immediately.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    name = type(exc).__name__
+    if "Timeout" in name or "Connection" in name:
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in THROTTLING_MARKERS)
+
+
+def backoff(attempt, policy=None):
+    """Sleep before retrying something that failed because of upstream trouble"""
+    time.sleep((policy or default_policy).delay(attempt))
+
+
+def call_with_retry(provider, func, *args, policy=None, max_attempts=None, tokens=1, **kwargs):
+    """
+    Call `func` under `provider`'s rate limiter, retrying transient upstream
+    errors with jittered exponential backoff (or the provider's Retry-After).
+    Non-transient errors and the last failed attempt are re-raised.
+    """
+    policy = policy or default_policy
+    max_attempts = max_attempts or policy.max_attempts
+    limiter = limiters[provider]
+    attempt = 0
+    while True:
+        limiter.acquire(tokens)
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            attempt += 1
+            if attempt >= max_attempts or not is_transient(e):
+                raise
+            wait = retry_after(e)
+            if wait is not None:
+                # A bogus or huge Retry-After must not stall every caller for longer than a backoff would
+                wait = min(wait, policy.max_delay)
+                # Throttling applies to every caller, so the whole bucket waits it out in acquire()
+                print(f"{provider} asked to retry after {wait:.1f}s ({type(e).__name__}: {e})")
+                limiter.drain(wait)
+                continue
+            wait = policy.delay(attempt)
+            print(f"{provider} request failed ({type(e).__name__}: {e}), retrying in {wait:.1f}s")
+            time.sleep(wait)
@@ -1,9 +1,13 @@
 import http.server
 import socketserver
 import os
+import re
 
 PORT = 5556
 
+# Videos published by combine.py are named after their content hash, so they never change
+IMMUTABLE_VIDEO = re.compile(r"^/[0-9a-f]{32}\.mp4$")
+
 
 class VideoHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     extensions_map = {
@@ -25,6 +29,8 @@ class VideoHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', '*')
         self.send_header('Access-Control-Expose-Headers', 'Content-Length, Content-Range')
         self.send_header('Access-Control-Allow-Credentials', 'true')
+        if IMMUTABLE_VIDEO.match(self.path.split('?')[0]):
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
         http.server.SimpleHTTPRequestHandler.end_headers(self)
 
     def do_OPTIONS(self):
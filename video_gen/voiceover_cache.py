@@ -0,0 +1,244 @@
+import ast
+import functools
+import hashlib
+import importlib
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import types
+import uuid
+from pathlib import Path
+
+# elevenlabs synthesizes with ElevenLabs as the generated code asks; fake makes silent audio locally
+TTS_SERVICE = os.getenv("TTS_SERVICE", "elevenlabs")
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") == "1"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+# Seconds the fake service takes per synthesis, to stand in for the real round trip in benchmarks
+FAKE_TTS_LATENCY = float(os.getenv("FAKE_TTS_LATENCY", "0"))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# Speech services generated code may construct, by class name
+SERVICE_MODULES = {"ElevenLabsService": "manim_voiceover.services.elevenlabs"}
+# Constructor arguments that don't change the synthesized audio
+NON_AUDIO_ARGUMENTS = {"cache_dir", "global_speed", "transcription_model", "transcription_kwargs"}
+
+
+class TTSCache:
+    """
+    Persistent cache of synthesized voiceover audio shared by every job and
+    render process. Entries are keyed on (service, voice and settings, text);
+    each is the audio file plus the service's result as JSON. File mtimes
+    track recency and the least recently used entries are evicted once the
+    cache grows past `max_bytes`. Writes are renamed into place, so renders in
+    other processes never see half-written entries.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(service, settings, text):
+        material = json.dumps({"service": service, "settings": settings, "text": text}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def contains(self, key):
+        return (self.directory / f"{key}.json").exists()
+
+    def get(self, key, cache_dir, path=None):
+        """
+        Copy cached audio into cache_dir (as `path`, if given) and return the
+        stored result pointing at it, or None on a miss
+        """
+        result_path = self.directory / f"{key}.json"
+        try:
+            result = json.loads(result_path.read_text())
+            audio_name = path or key + Path(result["original_audio"]).suffix
+            shutil.copy2(self.directory / f"{key}.audio", Path(cache_dir) / audio_name)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(result_path)
+        return {**result, "original_audio": audio_name}
+
+    def put(self, key, audio_path, result):
+        with self.lock:
+            staging = f".{key}.{uuid.uuid4().hex}"
+            shutil.copy2(audio_path, self.directory / f"{staging}.audio")
+            (self.directory / f"{staging}.json").write_text(json.dumps(result))
+            # Audio first, so an entry's JSON never points at missing audio
+            os.replace(self.directory / f"{staging}.audio", self.directory / f"{key}.audio")
+            os.replace(self.directory / f"{staging}.json", self.directory / f"{key}.json")
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for result_path in self.directory.glob("*.json"):
+            if result_path.name.startswith("."):
+                continue
+            audio_path = result_path.with_suffix(".audio")
+            try:
+                size = result_path.stat().st_size + audio_path.stat().st_size
+                entries.append((result_path.stat().st_mtime, size, result_path, audio_path))
+            except FileNotFoundError:
+                continue
+            total += size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, result_path, audio_path = entries.pop(0)
+            result_path.unlink(missing_ok=True)
+            audio_path.unlink(missing_ok=True)
+            total -= size
+            print(f"Evicted TTS cache entry {result_path.stem}")
+
+
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES) if TTS_CACHE_ENABLED else None
+
+
+def audio_settings(kwargs):
+    return {name: value for name, value in kwargs.items() if name not in NON_AUDIO_ARGUMENTS}
+
+
+def cached_service(service_class, service_name):
+    """
+    Subclass of a manim_voiceover speech service that looks each text up in
+    the TTS cache before synthesizing it, and stores what it synthesizes
+    """
+
+    class CachedSpeechService(service_class):
+        def __init__(self, *args, **kwargs):
+            self.tts_settings = {"args": list(args), **audio_settings(kwargs)}
+            super().__init__(*args, **kwargs)
+
+        def generate_from_text(self, text, cache_dir=None, path=None, **kwargs):
+            if tts_cache is None:
+                return super().generate_from_text(text, cache_dir=cache_dir, path=path, **kwargs)
+            cache_dir = Path(cache_dir or self.cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            key = TTSCache.key(service_name, self.tts_settings, text)
+            result = tts_cache.get(key, cache_dir, path)
+            if result is not None:
+                print(f"TTS cache hit for {text[:40]!r}")
+                return result
+            result = super().generate_from_text(text, cache_dir=cache_dir, path=path, **kwargs)
+            tts_cache.put(key, cache_dir / result["original_audio"], result)
+            return result
+
+    CachedSpeechService.__name__ = service_class.__name__
+    CachedSpeechService.__qualname__ = service_class.__qualname__
+    return CachedSpeechService
+
+
+@functools.lru_cache(maxsize=None)
+def fake_service_class():
+    """
+    Offline stand-in for ElevenLabsService (same constructor arguments) that
+    writes silence about as long as the text would take to say, after
+    FAKE_TTS_LATENCY seconds
+    """
+    from manim_voiceover.services.base import SpeechService
+
+    class FakeSpeechService(SpeechService):
+        def __init__(self, voice_name=None, voice_id=None, model=None, voice_settings=None, **kwargs):
+            super().__init__(**kwargs)
+
+        def generate_from_text(self, text, cache_dir=None, path=None, **kwargs):
+            cache_dir = Path(cache_dir or self.cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            input_data = {"input_text": text, "service": "fake"}
+            audio_name = path or hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] + ".mp3"
+            time.sleep(FAKE_TTS_LATENCY)
+            duration = max(1.0, len(text.split()) / 2.5)
+            subprocess.run(
+                [FFMPEG_BIN, "-y", "-loglevel", "error", "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono",
+                 "-t", f"{duration:.2f}", "-q:a", "9", str(cache_dir / audio_name)],
+                check=True,
+            )
+            return {"input_text": text, "input_data": input_data, "original_audio": audio_name}
+
+    return FakeSpeechService
+
+
+def install():
+    """
+    Route the speech services generated scene code constructs through the TTS
+    cache (and through the fake service with TTS_SERVICE=fake). Must run in the
+    render process before the scene code is executed; a no-op without
+    manim_voiceover. The fake service doesn't need the providers' SDKs.
+    """
+    for class_name, module_name in SERVICE_MODULES.items():
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            if TTS_SERVICE != "fake":
+                continue
+            try:
+                fake_service_class()
+            except ImportError:
+                return
+            # Generated code imports the service from here, so give it a module to find the fake in
+            module = sys.modules[module_name] = types.ModuleType(module_name)
+            setattr(module, class_name, object)
+        service_class = getattr(module, class_name)
+        if getattr(service_class, "tts_cache_installed", False):
+            continue
+        if TTS_SERVICE == "fake":
+            service_class, service_name = fake_service_class(), "fake"
+        else:
+            service_name = class_name
+        patched = cached_service(service_class, service_name)
+        patched.tts_cache_installed = True
+        setattr(module, class_name, patched)
+
+
+def literal_kwargs(call):
+    """A call's keyword arguments, or None if any of them isn't a literal"""
+    try:
+        return {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords if keyword.arg}
+    except ValueError:
+        return None
+
+
+def pending_syntheses(code):
+    """
+    How many voiceover texts in scene code would still be sent to the TTS
+    provider: those not in the cache, or that can't be checked statically
+    (non-literal text or voice settings). The fake service needs none.
+    """
+    if TTS_SERVICE == "fake":
+        return 0
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code.count(".voiceover(")
+    services = [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in SERVICE_MODULES
+    ]
+    texts = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "voiceover":
+            values = [keyword.value for keyword in node.keywords if keyword.arg == "text"] + node.args[:1]
+            texts.append(values[0].value if values and isinstance(values[0], ast.Constant) else None)
+
+    # Only one statically known service tells us which cache entries to look for
+    if tts_cache is None or len(services) != 1 or services[0].args or literal_kwargs(services[0]) is None:
+        return len(texts)
+    service_name = services[0].func.id
+    settings = {"args": [], **audio_settings(literal_kwargs(services[0]))}
+    return sum(1 for text in texts if text is None or not tts_cache.contains(TTSCache.key(service_name, settings, text)))
+
+
+if __name__ == "__main__":
+    # Stands in for the `manim` command, so CLI renders go through the TTS cache as well
+    install()
+    sys.argv = ["manim"] + sys.argv[1:]
+    runpy.run_module("manim", run_name="__main__")